@@ -0,0 +1,138 @@
+# AI Lab 2: Games and ConnectFour
+
+# Benchmarks for the game representation, separate from the lab tests.
+# Run from the lab directory:
+#     python benchmarks.py
+
+import os
+import tracemalloc
+from copy import deepcopy
+from random import Random
+from time import time
+from timeit import repeat
+
+from game_api import *
+
+from lab2 import (state_starting_connectfour, state_UHOH, heuristic_connectfour,
+                  minimax_search_alphabeta, progressive_deepening)
+from parallel_search import lazy_smp_search, start_pool, ybwc_search_alphabeta
+
+
+def random_game_states(num_games=500, max_moves=42, seed=0) :
+    """Return the states of num_games random games from the empty board, each
+    cut off after max_moves moves, as one list."""
+    rng = Random(seed)
+    states = []
+    for game in range(num_games) :
+        state = state_starting_connectfour
+        for move_number in range(max_moves) :
+            moves = state.generate_next_moves()
+            if not moves :
+                break
+            state = state.make_move(rng.choice(moves))
+            states.append(state)
+    return states
+
+def measure_node_memory(num_games=500, max_moves=20) :
+    """Return the average number of bytes held by each AbstractGameState (and
+    the ConnectFourBoard inside it) made while playing random games."""
+    tracemalloc.start()
+    try :
+        before = tracemalloc.get_traced_memory()[0]
+        states = random_game_states(num_games, max_moves)
+        after = tracemalloc.get_traced_memory()[0]
+    finally :
+        tracemalloc.stop()
+    return (after - before) / len(states)
+
+def generic_deepcopy(obj) :
+    """Return deepcopy(obj) as it would be without the __deepcopy__ methods of
+    the game classes, to compare their copy() methods against."""
+    classes = (ConnectFourBoard, AbstractGameState, AnytimeValue)
+    hooks = [cls.__dict__['__deepcopy__'] for cls in classes]
+    try :
+        for cls in classes :
+            del cls.__deepcopy__
+        return deepcopy(obj)
+    finally :
+        for cls, hook in zip(classes, hooks) :
+            cls.__deepcopy__ = hook
+
+def time_per_call(fn, number=200) :
+    "Return the best time of one call to fn, in microseconds."
+    return min(repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def compare_copies() :
+    """Return a list of (name, microseconds with copy(), microseconds with the
+    generic deepcopy) for a board, a game state and an AnytimeValue."""
+    state = random_game_states(1, 20)[-1]
+    anytime_value = progressive_deepening(state_UHOH, heuristic_connectfour, depth_limit=4)
+    objects = [('ConnectFourBoard', state.get_snapshot()),
+               ('AbstractGameState', state),
+               ('AnytimeValue (4 levels)', anytime_value)]
+    results = []
+    for name, obj in objects :
+        results.append((name, time_per_call(obj.copy),
+                        time_per_call(lambda : generic_deepcopy(obj), number=20)))
+    return results
+
+def time_to_depth(state=state_starting_connectfour, depth=10, worker_counts=None) :
+    """Return a list of (number of workers, seconds, evaluations by worker 0)
+    for lazy_smp_search to finish depth levels of state, for 1, 2, 4, ...
+    workers up to the number of CPUs."""
+    if worker_counts is None :
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= (os.cpu_count() or 1) :
+            worker_counts.append(worker_counts[-1] * 2)
+    results = []
+    for num_workers in worker_counts :
+        start_time = time()
+        anytime_value = lazy_smp_search(state, heuristic_connectfour, depth, num_workers=num_workers)
+        results.append((num_workers, time() - start_time, anytime_value.get_total_evaluations()))
+    return results
+
+def compare_ybwc(state=state_starting_connectfour, depth=7, max_workers=None) :
+    """Search state to depth with minimax_search_alphabeta and with
+    ybwc_search_alphabeta, and return a dict of the seconds and evaluations of
+    each, the speedup, the search overhead (the extra evaluations of the
+    parallel search, as a fraction of the serial ones), and the stats of the
+    parallel search (see ybwc_search_alphabeta). The worker processes are
+    started before the clock starts."""
+    max_workers = max_workers or os.cpu_count() or 1
+    start_time = time()
+    path, score, serial_evals = minimax_search_alphabeta(state, heuristic_fn=heuristic_connectfour,
+                                                         depth_limit=depth)
+    serial_time = time() - start_time
+    stats = {}
+    with start_pool(max_workers) as executor :
+        list(executor.map(abs, range(max_workers)))
+        start_time = time()
+        path, score, parallel_evals = ybwc_search_alphabeta(state, heuristic_fn=heuristic_connectfour,
+                                                            depth_limit=depth, executor=executor,
+                                                            max_workers=max_workers, stats=stats)
+        parallel_time = time() - start_time
+    return {'workers': max_workers, 'serial_time': serial_time, 'serial_evals': serial_evals,
+            'parallel_time': parallel_time, 'parallel_evals': parallel_evals,
+            'speedup': serial_time / parallel_time,
+            'overhead': (parallel_evals - serial_evals) / serial_evals,
+            'split_points': stats['split_points'], 'aborted': stats['aborted'],
+            'aborted_evals': stats['aborted_evals']}
+
+
+if __name__ == '__main__':
+    print("Memory per game state: " + "{0:.0f}".format(measure_node_memory()) + " bytes")
+    for name, copy_time, deepcopy_time in compare_copies() :
+        print(name + ": copy() " + "{0:.1f}".format(copy_time) + " us, deepcopy "
+              + "{0:.1f}".format(deepcopy_time) + " us ("
+              + "{0:.1f}".format(deepcopy_time / copy_time) + "x)")
+    times = time_to_depth()
+    for num_workers, seconds, evals in times :
+        print("Lazy SMP to depth 10, " + str(num_workers) + " workers: " + "{0:.2f}".format(seconds)
+              + " s (" + "{0:.2f}".format(times[0][1] / seconds) + "x), " + str(evals) + " evaluations")
+    ybwc = compare_ybwc()
+    print("YBWC to depth 7, " + str(ybwc['workers']) + " workers: " + "{0:.2f}".format(ybwc['parallel_time'])
+          + " s against " + "{0:.2f}".format(ybwc['serial_time']) + " s serial ("
+          + "{0:.2f}".format(ybwc['speedup']) + "x), " + str(ybwc['parallel_evals']) + " evaluations against "
+          + str(ybwc['serial_evals']) + " (" + "{0:+.1%}".format(ybwc['overhead']) + " overhead), "
+          + str(ybwc['split_points']) + " split points, " + str(ybwc['aborted']) + " brothers aborted after "
+          + str(ybwc['aborted_evals']) + " evaluations")
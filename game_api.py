@@ -1,25 +1,101 @@
 # AI Lab 2: Games and ConnectFour 
 
 from copy import deepcopy
+from collections import namedtuple
 from functools import reduce
 from abc import ABC, abstractmethod
+from random import Random
+from weakref import WeakValueDictionary
 
 def always_zero(state, maximize=True):
     return 0
 
+class GameRules :
+    """The functions that define a game, shared by all of its states. Rules are
+    immutable and interned: while any state still uses them, making GameRules
+    from the same functions again returns the same object, and copying or
+    unpickling one does too.
+
+    The last three functions are optional shortcuts:
+    has_next_states_fn(snapshot) tells whether generate_next_states_fn(snapshot)
+    would return any snapshots, without making them. next_moves_fn(snapshot)
+    returns the moves in the order of the snapshots from
+    generate_next_states_fn(snapshot), and apply_move_fn(snapshot, move) returns
+    the snapshot after the move, so that next states can be built one at a time
+    (see AbstractGameState.generate_next_moves). A move should equal the
+    get_previous_move() of the snapshot it leads to. next_moves_fn and
+    apply_move_fn are given together or not at all.
+
+    A game can declare its shortcuts once, as attributes of the same names on
+    generate_next_states_fn; shortcuts that are not given are taken from there,
+    so rules made from just the first three functions still get them."""
+
+    __slots__ = ('is_game_over_fn', 'generate_next_states_fn', 'endgame_score_fn',
+                 'has_next_states_fn', 'next_moves_fn', 'apply_move_fn', '__weakref__')
+
+    interned = WeakValueDictionary()
+
+    def __new__(cls, is_game_over_fn, generate_next_states_fn, endgame_score_fn,
+                has_next_states_fn=None, next_moves_fn=None, apply_move_fn=None) :
+        if has_next_states_fn is None :
+            has_next_states_fn = getattr(generate_next_states_fn, 'has_next_states_fn', None)
+        if next_moves_fn is None and apply_move_fn is None :
+            next_moves_fn = getattr(generate_next_states_fn, 'next_moves_fn', None)
+            apply_move_fn = getattr(generate_next_states_fn, 'apply_move_fn', None)
+        if (next_moves_fn is None) != (apply_move_fn is None) :
+            raise ValueError("next_moves_fn and apply_move_fn must be given together")
+        fns = (is_game_over_fn, generate_next_states_fn, endgame_score_fn,
+               has_next_states_fn, next_moves_fn, apply_move_fn)
+        rules = cls.interned.get(fns)
+        if rules is None :
+            rules = object.__new__(cls)
+            for name, fn in zip(cls.__slots__, fns) :
+                object.__setattr__(rules, name, fn)
+            cls.interned[fns] = rules
+        return rules
+
+    def __setattr__(self, name, value) :
+        raise AttributeError("GameRules are immutable")
+
+    def __reduce__(self) :
+        return (GameRules, (self.is_game_over_fn, self.generate_next_states_fn,
+                            self.endgame_score_fn, self.has_next_states_fn,
+                            self.next_moves_fn, self.apply_move_fn))
+
+    def __copy__(self) :
+        return self
+
+    def __deepcopy__(self, memo) :
+        return self
+
 class AbstractGameState :
 
+    __slots__ = ('snapshot', 'starting_state', 'rules', 'cached_next_states')
+
     def __init__(self,
                  snapshot,
-                 is_game_over_fn,
-                 generate_next_states_fn,
-                 endgame_score_fn) :
-
+                 is_game_over_fn=None,
+                 generate_next_states_fn=None,
+                 endgame_score_fn=None,
+                 rules=None) :
+        """The game's functions can be given one by one, or as GameRules."""
         self.snapshot = snapshot
         self.starting_state = snapshot
-        self.is_game_over_fn = is_game_over_fn
-        self.generate_next_states_fn = generate_next_states_fn
-        self.endgame_score_fn = endgame_score_fn
+        self.rules = rules or GameRules(is_game_over_fn, generate_next_states_fn,
+                                        endgame_score_fn)
+        self.cached_next_states = None
+
+    @property
+    def is_game_over_fn(self) :
+        return self.rules.is_game_over_fn
+
+    @property
+    def generate_next_states_fn(self) :
+        return self.rules.generate_next_states_fn
+
+    @property
+    def endgame_score_fn(self) :
+        return self.rules.endgame_score_fn
 
     def __str__(self) :
         return "\n<AbstractGameState representing:\n" + self.snapshot.__str__() + "\n>"
@@ -28,53 +104,191 @@ class AbstractGameState :
         return (is_class_instance(other, 'AbstractGameState')
                 and self.snapshot.__eq__(other.snapshot))
 
+    def __hash__(self):
+        return hash(self.snapshot)
+
+    def has_key(self):
+        "Return True if the snapshot has a position key (see key)."
+        return hasattr(self.snapshot, 'key')
+
+    def key(self):
+        "Return the position key of the snapshot (see ConnectFourBoard.key)."
+        return self.snapshot.key()
+
+    def canonical_key(self):
+        """Return the key shared by the snapshot and its mirror image (see
+        ConnectFourBoard.canonical_key), or key() if the game has no mirror."""
+        if not hasattr(self.snapshot, 'canonical_key') :
+            return self.key()
+        return self.snapshot.canonical_key()
+
+    def is_symmetric(self):
+        "Return True if the snapshot is its own mirror image."
+        return hasattr(self.snapshot, 'is_symmetric') and self.snapshot.is_symmetric()
+
+    def mirror_move(self, move_id):
+        """Return the identifier of the move that mirrors move_id (see
+        get_move_id). Games with no mirror return move_id itself."""
+        if not hasattr(self.snapshot, 'mirror_move') :
+            return move_id
+        return self.snapshot.mirror_move(move_id)
+
     def wrap(self, snapshot) :
-        return AbstractGameState(snapshot, self.is_game_over_fn,
-                                 self.generate_next_states_fn, self.endgame_score_fn)
+        return AbstractGameState(snapshot, rules=self.rules)
 
     def get_snapshot(self):
         return self.snapshot
 
     def is_game_over(self) :
-        return len(self.generate_next_states()) == 0 or self.is_game_over_fn(self.snapshot)
+        return self.rules.is_game_over_fn(self.snapshot) or not self.has_next_states()
+
+    def has_next_states(self) :
+        """Return True if there is at least one next state. If the rules have a
+        has_next_states_fn, no next states are built. Otherwise they are
+        generated and kept for the next call to generate_next_states."""
+        if self.cached_next_states is None :
+            if self.rules.has_next_states_fn is not None :
+                return self.rules.has_next_states_fn(self.snapshot)
+            self.cached_next_states = self.generate_next_states()
+        return len(self.cached_next_states) > 0
 
     def generate_next_states(self) :
-        return list(map(self.wrap, self.generate_next_states_fn(self.snapshot)))
+        """Return a list of the next states. Next states kept by has_next_states
+        are handed over rather than generated again; they are not kept after
+        that, so that a search does not hold on to every state it has visited."""
+        next_states, self.cached_next_states = self.cached_next_states, None
+        if next_states is None :
+            next_states = list(map(self.wrap, self.rules.generate_next_states_fn(self.snapshot)))
+        return next_states
+
+    def generate_next_moves(self) :
+        """Return a list of the moves that can be made from this state, in the
+        same order as generate_next_states, to be passed to make_move. If the
+        rules have move functions (see GameRules), no next states are built
+        until make_move is called. Otherwise the moves are the next states
+        themselves."""
+        if self.rules.next_moves_fn is None :
+            return self.generate_next_states()
+        return list(self.rules.next_moves_fn(self.snapshot))
+
+    def make_move(self, move) :
+        "Return the next state reached by move, one of generate_next_moves()."
+        if self.rules.apply_move_fn is None :
+            return move
+        return self.wrap(self.rules.apply_move_fn(self.snapshot, move))
+
+    def get_move_id(self, move) :
+        """Return the identifier of move, one of generate_next_moves(): the
+        get_previous_move() of the state it leads to, which may be None."""
+        if self.rules.next_moves_fn is None :
+            return move.get_previous_move()
+        return move
 
     def describe_previous_move(self) :
         return self.snapshot.describe_previous_move()
 
+    def get_previous_move(self) :
+        """Return an identifier for the most recent move leading to the current
+        state (a column, for Connect Four), or None if the snapshot has none."""
+        if not hasattr(self.snapshot, 'get_previous_move') :
+            return None
+        return self.snapshot.get_previous_move()
+
     def get_endgame_score(self, is_current_player_maximizer=True) :
         # only for leaf nodes
         if not self.is_game_over() :
             raise ValueError("Only endgame states have endgame score defined.")
-        return self.endgame_score_fn(self.snapshot, is_current_player_maximizer)
+        return self.rules.endgame_score_fn(self.snapshot, is_current_player_maximizer)
 
     def restart(self) :
         self.snapshot = self.starting_state
+        self.cached_next_states = None
         return self
 
     def copy(self):
-        return deepcopy(self)
+        return self.__deepcopy__({})
+
+    def __deepcopy__(self, memo) :
+        """Copy the snapshots, but share the rules, which are immutable. Next
+        states kept by has_next_states are not copied."""
+        new_state = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new_state
+        new_state.snapshot = deepcopy(self.snapshot, memo)
+        new_state.starting_state = deepcopy(self.starting_state, memo)
+        new_state.rules = self.rules
+        new_state.cached_next_states = None
+        return new_state
 
 
 class ConnectFourBoard :
     num_rows = 6  # board height
     num_cols = 7  # board width
 
+    # no per-board __dict__: search keeps many boards alive at once
+    __slots__ = ('piece_masks', 'occupied_mask', 'num_pieces', 'column_heights',
+                 'zobrist_key', 'mirror_zobrist_key', 'winning_pieces', 'last_move', 'analysis',
+                 'move_stack', 'players', 'whose_turn')
+
     def __init__(self, board_array=None, players=['Player One','Player Two'],
                  whose_turn=None) :
-        """A board array is a list of rows. The pieces are either 0 (no player), 1, or 2."""
+        """A board array is a list of rows. The pieces are either 0 (no player), 1, or 2.
+
+        The board is stored as bitboards: one integer mask per piece type and
+        a mask of occupied cells. Column c owns bits c*(num_rows+1) up to
+        c*(num_rows+1) + num_rows-1, bottom cell first. The spare bit on top
+        of each column is always empty, so shifted masks never wrap from one
+        column into the next."""
         if (not isinstance(players, (list, tuple))) or len(players) != 2:
             raise TypeError("Expected list of two players, got "+str(players))
-        if not board_array :
-            board_array = [[0 for c in range(ConnectFourBoard.num_cols)] for r in range(ConnectFourBoard.num_rows)]
-        self.board_array = [ [x if x is not 0 else None for x in row] for row in board_array]
-        self.prev_move_string = 'none'
-        self.players = players[:]
+        self.piece_masks = [0, 0]
+        self.occupied_mask = 0
+        for row_index, row in enumerate(board_array or []) :
+            for col_index, piece in enumerate(row) :
+                if piece in (1, 2) :
+                    bit = self.__bit__(col_index, row_index)
+                    self.piece_masks[piece - 1] |= bit
+                    self.occupied_mask |= bit
+        # kept up to date by play() and undo(), so that piece counts, column
+        # heights and whose piece parity applies are constant-time lookups
+        self.num_pieces = popcount(self.occupied_mask)
+        self.column_heights = bytearray(self.__stack_height__(col) for col in range(self.num_cols))
+        zobrist = get_zobrist_table(self.num_rows, self.num_cols)
+        mirror_zobrist = get_mirror_zobrist_table(self.num_rows, self.num_cols)
+        self.zobrist_key = 0
+        self.mirror_zobrist_key = 0
+        for piece_type in (1, 2) :
+            mask = self.piece_masks[piece_type - 1]
+            while mask :
+                bit = mask & -mask
+                mask ^= bit
+                self.zobrist_key ^= zobrist[piece_type - 1][bit.bit_length() - 1]
+                self.mirror_zobrist_key ^= mirror_zobrist[piece_type - 1][bit.bit_length() - 1]
+        # bit flags for the piece types (1 -> 1, 2 -> 2) that have four in a row
+        self.winning_pieces = sum(piece_type for piece_type in (1, 2)
+                                  if self.__has_four__(self.piece_masks[piece_type - 1]))
+        # (column, player) of the most recent move, or a description string
+        # set through prev_move_string; see prev_move_string
+        self.last_move = 'none'
+        self.analysis = None
+        # (column, piece type, winning_pieces, last_move) for each move
+        # played on this board or its ancestors, so that it can be undone. The
+        # stack is a linked list of pairs (top move, rest of the stack), or
+        # None when empty, so copies of a board share the moves they have in
+        # common.
+        self.move_stack = None
+        # a tuple, current player first, so copies can share it
+        self.players = tuple(players)
         self.whose_turn = whose_turn if whose_turn in players else players[0]
         if self.whose_turn != self.players[0] :
-            self.players.reverse()
+            self.players = self.players[::-1]
+
+    @property
+    def board_array(self) :
+        """The board as a list of rows, top row first, with pieces None (no
+        player), 1, or 2. The rows are rebuilt from the bitboards on every
+        access, so modifying them does not modify the board."""
+        return [[self.get_piece(col, row) for col in range(ConnectFourBoard.num_cols)]
+                for row in range(ConnectFourBoard.num_rows)]
 
     def get_current_player_name(self) :
         """Return the current player. By default, 'Player One' or 'Player Two'."""
@@ -84,7 +298,7 @@ class ConnectFourBoard :
         """Set the current player. By default, 'Player One' or 'Player Two'."""
         assert player in self.players
         self.whose_turn = player
-        self.players = [player] + [x for x in self.players if x != player]
+        self.players = tuple([player] + [x for x in self.players if x != player])
 
     def get_other_player_name(self) :
         """Return the other player (the one whose turn it is NOT). By default,
@@ -98,7 +312,10 @@ class ConnectFourBoard :
         return p if self.__piece_type__(p) == player_number else q
 
     def get_piece(self, col, row) :
-        return self.board_array[row][col]
+        bit = self.__bit__(col, row)
+        if not self.occupied_mask & bit :
+            return None
+        return 1 if self.piece_masks[0] & bit else 2
 
     def count_pieces(self, current_player=None) :
         """Return the total number of pieces on the board. If player is
@@ -106,69 +323,199 @@ class ConnectFourBoard :
         if current_player not in [True, False, None]:
             raise TypeError("Expected boolean value for current_player, got "
                             + str(current_player))
+        if current_player is None :
+            return self.num_pieces
         piece_type = self.__piece_type__(self.get_current_player_name() if current_player else self.get_other_player_name())
-        player_test = (lambda x: x) if current_player is None else (lambda piece: piece == piece_type)
-        return len(list(filter(player_test, sum(self.board_array,[]))))
+        return popcount(self.piece_masks[piece_type - 1])
 
     def get_column_height(self, col_number) :
         """Return the number of pieces in the column; e.g., 0 if the column is empty."""
-        height = 0
-        for row in reversed(self.board_array) :
-            if row[col_number] :
-                height += 1
-            else :
-                break
-        return height
+        return self.column_heights[col_number]
 
     def is_column_full(self, col_number) :
         "Return True if column is full, False otherwise"
-        return self.get_column_height(col_number) == ConnectFourBoard.num_rows
+        return self.column_heights[col_number] == ConnectFourBoard.num_rows
 
     def add_piece(self, col_number, player=None) :
         """Adds a piece belonging to the player to the given column.
         Returns new board without modifying original."""
 
+        if self.is_column_full(col_number) :
+            raise IndexError("Can't add piece to full column "+str(col_number)+".")
+        return self.copy().play(col_number, player)
+
+    def play(self, col_number, player=None) :
+        """Adds a piece belonging to the player to the given column, modifying
+        this board in place, and pushes the move onto the move stack so that
+        it can be taken back with undo(). Returns the board itself."""
+
         if self.is_column_full(col_number) :
             raise IndexError("Can't add piece to full column "+str(col_number)+".")
 
         player = player or self.whose_turn
         piece_type = self.__piece_type__(player)
-        new_board = self.copy()
-        height = 1 + new_board.get_column_height(col_number)
-        new_board.board_array[-height][col_number] = piece_type
-        new_board.prev_move_string = ("Put " + str(player)
-                                      + "'s piece in col " + str(col_number))
+        bit_index = (col_number * (ConnectFourBoard.num_rows + 1)
+                     + self.column_heights[col_number])
+        bit = 1 << bit_index
+        self.move_stack = ((col_number, piece_type, self.winning_pieces,
+                            self.last_move), self.move_stack)
+        self.zobrist_key ^= get_zobrist_table(self.num_rows, self.num_cols)[piece_type - 1][bit_index]
+        self.mirror_zobrist_key ^= get_mirror_zobrist_table(self.num_rows, self.num_cols)[piece_type - 1][bit_index]
+        self.piece_masks[piece_type - 1] |= bit
+        self.occupied_mask |= bit
+        self.num_pieces += 1
+        self.column_heights[col_number] += 1
+        self.analysis = None
+        if self.__four_through__(self.piece_masks[piece_type - 1], bit) :
+            self.winning_pieces |= piece_type
+        self.last_move = (col_number, player)
         # adding a piece causes the current player to swap
-        new_board.set_current_player_name(new_board.players[1])
-        return new_board
+        self.players = self.players[::-1]
+        self.whose_turn = self.players[0]
+        return self
+
+    def undo(self) :
+        """Takes back the most recent move made with play() or add_piece(),
+        modifying this board in place. Returns the board itself."""
+        if self.move_stack is None :
+            raise IndexError("No move to undo.")
+        move, self.move_stack = self.move_stack
+        col_number, piece_type, self.winning_pieces, self.last_move = move
+        self.column_heights[col_number] -= 1
+        bit_index = (col_number * (ConnectFourBoard.num_rows + 1)
+                     + self.column_heights[col_number])
+        bit = 1 << bit_index
+        self.zobrist_key ^= get_zobrist_table(self.num_rows, self.num_cols)[piece_type - 1][bit_index]
+        self.mirror_zobrist_key ^= get_mirror_zobrist_table(self.num_rows, self.num_cols)[piece_type - 1][bit_index]
+        self.piece_masks[piece_type - 1] &= ~bit
+        self.occupied_mask &= ~bit
+        self.num_pieces -= 1
+        self.analysis = None
+        self.players = self.players[::-1]
+        self.whose_turn = self.players[0]
+        return self
+
+    def has_four_in_a_row(self, current_player=None) :
+        """Return True if there is a chain of four or more pieces on the board.
+        If player is supplied, only that player's chains count. Win status is
+        recorded as pieces are added, so this takes constant time."""
+        if current_player not in [True, False, None]:
+            raise TypeError("Expected boolean value for current_player, got "
+                            + str(current_player))
+        if current_player is None :
+            return bool(self.winning_pieces)
+        piece_type = self.__piece_type__(self.get_current_player_name() if current_player else self.get_other_player_name())
+        return bool(self.winning_pieces & piece_type)
+
+    def get_analysis(self) :
+        """Return the BoardAnalysis of the current position, working it out the
+        first time it is asked for. It is thrown away by play() and undo()."""
+        if self.analysis is None :
+            self.analysis = BoardAnalysis(self)
+        return self.analysis
+
+    def is_game_over(self) :
+        "Return True if someone has four in a row or the board is full, False otherwise"
+        return (bool(self.winning_pieces)
+                or self.num_pieces == self.num_rows * self.num_cols)
+
+    def key(self) :
+        """Return a 64-bit Zobrist key for the position: the XOR of one fixed
+        random number per (piece type, cell) on the board. It is updated
+        incrementally by play() and undo(), and boards with the same pieces
+        in the same places always have the same key."""
+        return self.zobrist_key
+
+    def mirror_key(self) :
+        """Return the key() of this board mirrored left to right, which is
+        updated incrementally along with key()."""
+        return self.mirror_zobrist_key
+
+    def canonical_key(self) :
+        """Return the smaller of key() and mirror_key(), which is the same for
+        a board and its mirror image."""
+        return min(self.zobrist_key, self.mirror_zobrist_key)
+
+    def is_symmetric(self) :
+        "Return True if the board is the same when mirrored left to right."
+        return (self.zobrist_key == self.mirror_zobrist_key
+                and all(self.__mirror_mask__(mask) == mask for mask in self.piece_masks))
+
+    def mirror_move(self, col_number) :
+        "Return the column that mirrors col_number left to right."
+        return self.num_cols - 1 - col_number
 
     def describe_previous_move(self) :
         "Returns a string describing the most recent move leading to current state"
         return self.prev_move_string
 
+    @property
+    def prev_move_string(self) :
+        """A description of the most recent move, such as "Put Player One's
+        piece in col 3". Moves only record their column and player, and the
+        description is built when it is read. Setting it replaces the
+        description until the next move."""
+        if isinstance(self.last_move, str) :
+            return self.last_move
+        col_number, player = self.last_move
+        return "Put " + str(player) + "'s piece in col " + str(col_number)
+
+    @prev_move_string.setter
+    def prev_move_string(self, description) :
+        self.last_move = description
+
+    def get_previous_move(self) :
+        "Returns the column of the most recent move, or None if it is not known"
+        return self.move_stack[0][0] if self.move_stack is not None else None
+
+    def get_move_list(self) :
+        """Returns the columns of the moves played with play() or add_piece(),
+        oldest first. Pieces that were in the board array the first board was
+        made from are not moves, and are not included."""
+        moves = []
+        stack = self.move_stack
+        while stack is not None :
+            moves.append(stack[0][0])
+            stack = stack[1]
+        moves.reverse()
+        return moves
+
+    @classmethod
+    def from_moves(cls, moves, players=['Player One','Player Two'], whose_turn=None) :
+        """Returns the board reached by playing the given columns in order,
+        starting from an empty board with the given players."""
+        board = cls(players=players, whose_turn=whose_turn)
+        for col_number in moves :
+            board.play(col_number)
+        return board
+
     def copy(self) :
-        return deepcopy(self)
-
-    def __get_line__(self, col, row, dx, dy) :
-        """Return the list of pieces you get starting at (col, row) and
-        incrementing by dx,dy until you run out of board."""
-
-        indexes = [(col + i*dx, row + i*dy)
-                   for i in range((ConnectFourBoard.num_rows +
-                                      ConnectFourBoard.num_cols -1))]
-        # to determine if you've run out of board, see whether either col, row exceeds the max value
-        # or if the (col, row) changes from non-negative/negative or vice-versa.
-
-        pieces_line = []
-        for c,r in indexes :
-            if (c >= ConnectFourBoard.num_cols
-                or r >= ConnectFourBoard.num_rows
-                or c < -ConnectFourBoard.num_cols
-                or r < -ConnectFourBoard.num_rows) :
-                break
-            else :
-                pieces_line.append(self.get_piece(c, r))
-        return pieces_line
+        """Return a copy of this board. The bitboards are plain integers and
+        the players and move stack are immutable, so only the piece masks and
+        column heights need copying."""
+        new_board = self.__class__.__new__(self.__class__)
+        new_board.piece_masks = self.piece_masks[:]
+        new_board.occupied_mask = self.occupied_mask
+        new_board.num_pieces = self.num_pieces
+        new_board.column_heights = self.column_heights[:]
+        new_board.zobrist_key = self.zobrist_key
+        new_board.mirror_zobrist_key = self.mirror_zobrist_key
+        new_board.winning_pieces = self.winning_pieces
+        new_board.last_move = self.last_move
+        new_board.analysis = self.analysis
+        new_board.move_stack = self.move_stack
+        new_board.players = self.players
+        new_board.whose_turn = self.whose_turn
+        return new_board
+
+    def __copy__(self) :
+        return self.copy()
+
+    def __deepcopy__(self, memo) :
+        # copy() already shares nothing mutable with this board
+        new_board = self.copy()
+        memo[id(self)] = new_board
+        return new_board
 
     def get_all_chains(self, current_player=None):
         """Get all maximal contiguous chains of pieces. If player is provided,
@@ -176,17 +523,15 @@ class ConnectFourBoard :
         if current_player not in [True, False, None]:
             raise TypeError("Expected boolean value for current_player, got "
                             + str(current_player))
-        piece_type = self.__piece_type__(self.get_current_player_name() if current_player else self.get_other_player_name())
-        player_test = (lambda chain: True) if current_player is None else (lambda chain : chain[0] == piece_type)
-
-        ret = []
-        ret += self.get_singleton_chains()
-        ret += self.get_horizontal_chains(False)
-        ret += self.get_vertical_chains(False)
-        ret += self.get_northeast_chains(False)
-        ret += self.get_northwest_chains(False)
+        if current_player is None :
+            piece_types = (1, 2)
+        else :
+            piece_types = (self.__piece_type__(self.get_current_player_name() if current_player else self.get_other_player_name()),)
 
-        ret = list(filter(player_test, ret))
+        # copied, so that changing them does not change the cached analysis
+        analysis = self.get_analysis()
+        ret = [chain[:] for piece_type in piece_types
+               for chain in analysis.get_chains_of(piece_type)]
 
         # Uncomment these lines to print chains as lists of player names instead of lists of 1's and 2's:
         #whose = self.__whose_piece__()
@@ -195,107 +540,70 @@ class ConnectFourBoard :
         return ret
 
     def get_singleton_chains(self):
-        def has_twin_in_neighbors(col, row):
-            "returns True if piece has a neighbor of same type, else False"
-            piece_type = self.get_piece(col, row)
-            for x in [col-1, col, col+1]:
-                for y in [row-1, row, row+1]:
-                    if ((x, y) == (col, row) or x < 0 or y < 0
-                        or x >= self.num_cols or y >= self.num_rows):
-                        continue
-                    if self.get_piece(x, y) == piece_type:
-                        return True
-            return False
-
-        singleton_chains = []
-        for row_index in range(self.num_rows):
-            for col_index in range(self.num_cols):
-                piece_type = self.get_piece(col_index, row_index)
-                if piece_type is None or has_twin_in_neighbors(col_index, row_index):
-                    continue
-                singleton_chains.append([piece_type])
-        return singleton_chains
+        analysis = self.get_analysis()
+        return [[piece_type] for piece_type in (1, 2)
+                for i in range(analysis.count_singletons_of(piece_type))]
 
     def get_horizontal_chains(self, includeSingletons=False):
-        return self.__get_non_diagonal_chains__(1, 0, includeSingletons) # horizontal rightward
+        return self.__get_chains_along__(self.num_rows + 1, includeSingletons)
 
     def get_vertical_chains(self, includeSingletons=False):
-        return self.__get_non_diagonal_chains__(0, 1, includeSingletons) #vertical downward
-
-    def __get_non_diagonal_chains__(self, dx, dy, includeSingletons=False):
-        "Get all chains in a particular direction, horizontal or vertical."
-        ret = []
-        if dx > 0 :
-            # Iterate over all rows
-            for r in range(ConnectFourBoard.num_rows):
-                ret += self.__break_apart_line__(self.__get_line__(0, r, dx, dy))
-        if dx <= 0 :
-            # Iterate over all cols
-            for c in range(ConnectFourBoard.num_cols):
-                ret += self.__break_apart_line__(self.__get_line__(c, 0, dx, dy))
-        return [x for x in ret if includeSingletons or len(x) > 1]
-
-    def __break_apart_line__(self, line) :
-        """Given a line of pieces as returned by __get_line__, return a list of
-        the maximal contiguous subsequences.  For example:
-        [None, 1, None, 1, 1, 2, 2, 2] returns [[1],[1,1],[2,2,2]]."""
-        ret = []
-        current_chain = []
-
-        while line :
-            x = line.pop(0)
-            if x is None or (current_chain and current_chain[0] != x) :
-                if current_chain :
-                    ret.append(current_chain)
-                current_chain = []
-            if x is not None and (not current_chain or current_chain[0] == x) :
-                current_chain.append(x)
-        else :
-            if current_chain :
-                ret.append(current_chain)
-        return ret
+        return self.__get_chains_along__(1, includeSingletons)
 
     def get_northeast_chains(self, includeSingletons=False):
-        return self.__get_diagonal_chains__(+1, -1, includeSingletons)
+        return self.__get_chains_along__(self.num_rows + 2, includeSingletons)
 
     def get_northwest_chains(self, includeSingletons=False):
-        return self.__get_diagonal_chains__(-1, -1, includeSingletons)
-
-    def __get_diagonal_chains__(self, dx, dy=-1, includeSingletons=False):
-        indexes = self.__get_diagonal_indexes__(dx, dy, includeSingletons)
-        chains =  [[self.get_piece(col_row[0], col_row[1]) for col_row in chain] for chain in [x for x in indexes if x]]
-        chains = reduce(lambda a,b: a+b, list(map(self.__break_apart_line__, chains)))
-        chains = [chain for chain in chains if includeSingletons or len(chain) > 1]
-        return chains
-
-    def __get_diagonal_indexes__(self, dx, dy=-1, includeSingletons=False):
-        indexes = []
-
-        # north half of board
-        col_start = 0 if dx>0 else self.num_cols - 1
-        for row_start in range(self.num_rows - 1): # -1 to avoid double counting longest diagonal
-            indexes.append(self.__make_index_list__(col_start, row_start, dx, dy))
-
-        # south half of board
-        row_start = self.num_rows - 1
-        for col_start in range(self.num_cols): # including longest diagonal
-            indexes.append(self.__make_index_list__(col_start, row_start, dx, dy))
-
-        return indexes
-
-    def __make_index_list__(self, col_start, row_start, dx, dy):
-        ilist = []
-        x, y = col_start, row_start
-        while x >= 0 and y >= 0 and x < self.num_cols and y < self.num_rows:
-            ilist.append((x, y))
-            x += dx
-            y += dy
-        return ilist
+        return self.__get_chains_along__(self.num_rows, includeSingletons)
+
+    def __chain_shifts__(self) :
+        """Return the bit shifts that step to the next cell horizontally,
+        vertically, northeast and northwest."""
+        return get_line_tables(self.num_rows, self.num_cols).shifts
+
+    def __has_four__(self, mask) :
+        "Return True if the mask contains four in a row in any direction."
+        return get_bitboard_geometry(self.num_rows, self.num_cols).is_win(mask)
+
+    def __four_through__(self, mask, bit) :
+        """Return True if the piece at bit is part of four in a row in mask,
+        checking only the windows of four cells that contain it."""
+        for window in get_line_tables(self.num_rows, self.num_cols).cell_windows[bit.bit_length() - 1] :
+            if mask & window == window :
+                return True
+        return False
+
+    def __get_chains_along__(self, shift, includeSingletons=False):
+        "Get the maximal chains of both piece types along one direction."
+        min_length = 1 if includeSingletons else 2
+        analysis = self.get_analysis()
+        return [[piece_type] * length
+                for piece_type in (1, 2)
+                for length in analysis.get_run_lengths(piece_type, shift)
+                if length >= min_length]
 
     def __piece_type__(self, player=None) :
         player = player or self.whose_turn
-        num_pieces = len([x for x in reduce(lambda a,b:a+b, self.board_array) if bool(x)])
-        return [1,2][((player != self.whose_turn) + num_pieces) % 2]
+        return [1,2][((player != self.whose_turn) + self.num_pieces) % 2]
+
+    def __stack_height__(self, col) :
+        "Count the unbroken run of pieces up from the bottom of a column."
+        column = self.occupied_mask >> (col * (self.num_rows + 1))
+        return (column & ~(column + 1)).bit_length()
+
+    def __mirror_mask__(self, mask) :
+        "Return the bitboard mask mirrored left to right."
+        return get_bitboard_geometry(self.num_rows, self.num_cols).mirror(mask)
+
+    def __bit__(self, col, row) :
+        """Return the bitboard bit of the cell at (col, row), where row 0 is the
+        top row. Negative indexes count back from the end, as in board_array."""
+        if not (-self.num_cols <= col < self.num_cols
+                and -self.num_rows <= row < self.num_rows) :
+            raise IndexError("No cell at col "+str(col)+", row "+str(row)+".")
+        col %= self.num_cols
+        row %= self.num_rows
+        return 1 << (col * (self.num_rows + 1) + self.num_rows - 1 - row)
 
     def __whose_piece__(self) :
         """Return a dictionary sending piece symbol to player name."""
@@ -305,15 +613,19 @@ class ConnectFourBoard :
         """Given two ConnectFourBoard objects, returns True if they have pieces in
         the same places (that is, same .board_array attribute), otherwise False."""
         return (is_class_instance(other, 'ConnectFourBoard')
-                and (self.board_array == other.board_array))
+                and (self.piece_masks == other.piece_masks))
 
     def __eq__(self, other):
         return (is_class_instance(other, 'ConnectFourBoard')
-                and (self.board_array == other.board_array)
-                and (self.prev_move_string == other.prev_move_string)
+                and (self.piece_masks == other.piece_masks)
+                and (self.last_move == other.last_move
+                     or self.prev_move_string == other.prev_move_string)
                 and (self.players == other.players)
                 and (self.whose_turn == other.whose_turn))
 
+    def __hash__(self):
+        return hash(self.zobrist_key)
+
     def __str__(self) :
         ret = ""
         for row in self.board_array :
@@ -321,10 +633,106 @@ class ConnectFourBoard :
             ret += "\n"
         return ret
 
+class BoardAnalysis :
+    """Facts about one ConnectFourBoard position that scoring functions ask
+    for, each worked out the first time it is needed and then kept. Get it
+    from ConnectFourBoard.get_analysis rather than making one. As with
+    get_all_chains, current_player is True for the player whose turn it is and
+    False for the other player."""
+
+    def __init__(self, board) :
+        current_piece_type = board.__piece_type__(board.get_current_player_name())
+        self.piece_types = {True: current_piece_type, False: 3 - current_piece_type}
+        self.piece_masks = tuple(board.piece_masks)
+        self.empty_mask = ~board.occupied_mask
+        self.line_tables = get_line_tables(board.num_rows, board.num_cols)
+        self.chains = {}
+        self.singletons = {}
+        self.run_lengths = {}
+        self.open_threats = {}
+
+    def get_chains(self, current_player) :
+        """Return the player's maximal chains, singletons included, as lists
+        of piece types. The lists are shared, so do not modify them."""
+        return self.get_chains_of(self.piece_types[current_player])
+
+    def count_chains(self, current_player, length) :
+        "Return the number of the player's chains of exactly the given length."
+        return sum(1 for chain in self.get_chains(current_player) if len(chain) == length)
+
+    def get_longest_chain(self, current_player) :
+        "Return the length of the player's longest chain, or 0 with no pieces."
+        return max([len(chain) for chain in self.get_chains(current_player)] or [0])
+
+    def get_open_threats(self, current_player) :
+        """Return a bitmask of the empty cells that would give the player four
+        in a row, whether or not they can be played yet."""
+        piece_type = self.piece_types[current_player]
+        if piece_type not in self.open_threats :
+            mask = self.piece_masks[piece_type - 1]
+            threats = 0
+            for window in self.line_tables.windows :
+                missing = window & ~mask
+                # exactly one cell of the window is missing, and it is empty
+                if missing & self.empty_mask and not missing & (missing - 1) :
+                    threats |= missing
+            self.open_threats[piece_type] = threats
+        return self.open_threats[piece_type]
+
+    def count_open_threats(self, current_player) :
+        "Return the number of empty cells that would give the player four in a row."
+        return popcount(self.get_open_threats(current_player))
+
+    def get_chains_of(self, piece_type) :
+        """Return the chains of piece type 1 or 2: a chain for each piece with
+        no neighbor of its type (singletons), then the runs of two or more
+        along each direction."""
+        if piece_type not in self.chains :
+            chains = [[piece_type]] * self.count_singletons_of(piece_type)
+            for shift in self.line_tables.shifts :
+                chains += [[piece_type] * length
+                           for length in self.get_run_lengths(piece_type, shift)
+                           if length >= 2]
+            self.chains[piece_type] = chains
+        return self.chains[piece_type]
+
+    def count_singletons_of(self, piece_type) :
+        "Return the number of pieces of piece type 1 or 2 with no neighbor of their type."
+        if piece_type not in self.singletons :
+            mask = self.piece_masks[piece_type - 1]
+            neighbors = 0
+            for shift in self.line_tables.shifts :
+                neighbors |= (mask << shift) | (mask >> shift)
+            self.singletons[piece_type] = popcount(mask & ~neighbors)
+        return self.singletons[piece_type]
+
+    def get_run_lengths(self, piece_type, shift) :
+        """Return the lengths of the maximal runs of piece type 1 or 2 along
+        the direction of shift (see get_line_tables), shortest first. Runs
+        are counted one length at a time with whole-mask operations: starts
+        marks the first piece of each run, and run the pieces followed by at
+        least length - 1 more."""
+        if (piece_type, shift) not in self.run_lengths :
+            mask = self.piece_masks[piece_type - 1]
+            lengths = []
+            starts = mask & ~(mask << shift)
+            run = mask
+            length = 1
+            count = popcount(starts)
+            while count :
+                run &= mask >> (length * shift)
+                longer = popcount(starts & run)
+                lengths += [length] * (count - longer)
+                count = longer
+                length += 1
+            self.run_lengths[(piece_type, shift)] = lengths
+        return self.run_lengths[(piece_type, shift)]
+
 class AnytimeValue :
     def __init__(self, val=None) :
         self.value = val
         self.history = []
+        self.partial_value = None
         self.total_evaluations = 0
         if val is not None:
             self.set_value(val)
@@ -335,6 +743,20 @@ class AnytimeValue :
         self.value = val
         self.history.append(val)
         self.total_evaluations += val[2]
+    def set_partial_value(self, val):
+        """Set the value to the result of a level of progressive deepening that
+        ran out of time part way through. Unlike set_value, the result is not
+        added to the history, which only holds completed levels, and its
+        evaluations are not counted: the level counts all that it made, finished
+        or not, with add_evaluations."""
+        if not is_dfs_return_type(val):
+            raise TypeError('AnytimeValue.set_partial_value expected tuple (path, '
+                            +'score, number of evaluations)')
+        self.value = val
+        self.partial_value = val
+    def add_evaluations(self, num_evals):
+        """Count the evaluations made by a level that ran out of time."""
+        self.total_evaluations += num_evals
     def get_value(self) :
         return self.value
 
@@ -356,7 +778,300 @@ class AnytimeValue :
                 % len(self.history))
     __repr__ = __str__
     def copy(self):
-        return deepcopy(self)
+        return self.__deepcopy__({})
+    def __deepcopy__(self, memo):
+        """Copy the results, copying each state on their paths once even if
+        it is in several of them (the value is usually the last result in
+        the history too)."""
+        new_value = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new_value
+        new_value.value = deepcopy(self.value, memo)
+        new_value.history = deepcopy(self.history, memo)
+        new_value.partial_value = deepcopy(self.partial_value, memo)
+        new_value.total_evaluations = self.total_evaluations
+        return new_value
+
+EXACT = 'exact'
+LOWER_BOUND = 'lower'
+UPPER_BOUND = 'upper'
+
+TableEntry = namedtuple('TableEntry', ['key', 'depth', 'score', 'bound',
+                                       'best_move', 'maximize', 'generation'])
+
+class TranspositionTable :
+    """A fixed-size table of search results, indexed by position key.
+
+    Each entry records the depth searched below the position, the score, whether
+    that score is EXACT, a LOWER_BOUND (the search failed high) or an
+    UPPER_BOUND (it failed low), and the index of the best child found. When two
+    positions want the same slot, the replacement policy decides:
+      'depth'  - keep the entry searched deeper, unless it is left over from an
+                 earlier search (see new_search)
+      'always' - the newest entry always wins
+    Scores depend on the heuristic used, so use one table per heuristic.
+    If canonical is True, searches store a position and its mirror image in
+    the same entry (see ConnectFourBoard.canonical_key). That needs a
+    heuristic that scores mirror images the same, as heuristic_connectfour does."""
+
+    entry_bytes = 160  # approximate memory per stored entry, including its slot
+    replacement_policies = ('depth', 'always')
+
+    def __init__(self, size_mb=16, replacement='depth', canonical=True) :
+        if replacement not in self.replacement_policies :
+            raise ValueError("Unknown replacement policy " + str(replacement)
+                             + ", expected one of " + str(self.replacement_policies))
+        self.capacity = max(1, int(size_mb * 2**20) // self.entry_bytes)
+        self.replacement = replacement
+        self.canonical = canonical
+        self.slots = [None] * self.capacity
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self) :
+        "Mark existing entries as belonging to an earlier search."
+        self.generation += 1
+
+    def probe(self, key, maximize=True) :
+        "Return the TableEntry stored for this position, or None."
+        self.probes += 1
+        entry = self.slots[key % self.capacity]
+        if entry is None or entry.key != key or entry.maximize != maximize :
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, score, bound, best_move=None, maximize=True) :
+        index = key % self.capacity
+        old = self.slots[index]
+        if (self.replacement == 'depth' and old is not None and old.key != key
+            and old.generation == self.generation and old.depth > depth) :
+            return
+        self.stores += 1
+        self.slots[index] = TableEntry(key, depth, score, bound, best_move,
+                                       maximize, self.generation)
+
+    def __len__(self) :
+        return self.capacity - self.slots.count(None)
+
+    def __str__(self) :
+        return ("<TranspositionTable with %i of %i slots used, %i hits in %i probes>"
+                % (len(self), self.capacity, self.hits, self.probes))
+    __repr__ = __str__
+
+class MoveOrdering :
+    """Decides the order in which alpha-beta search tries the moves at a node.
+    Moves are identified by get_previous_move() of the resulting state (the
+    column, for Connect Four). Each heuristic can be switched on or off:
+      center  - try the columns nearest the middle of the board first
+      killers - first try the moves that recently caused a cutoff at the same
+                ply, which are often good in the sibling positions too
+      history - then try the moves that have caused the most cutoffs so far,
+                weighted by the depth of the subtree they cut off
+    Killers and history persist until new_search() is called, so that the
+    iterations of one progressive deepening search learn from each other. The
+    object also counts cutoffs per ply, to measure how well ordering works."""
+
+    def __init__(self, center=True, killers=True, history=True, num_killers=2) :
+        self.center = center
+        self.killers = killers
+        self.history = history
+        self.num_killers = num_killers
+        self.new_search()
+
+    def new_search(self) :
+        "Forget the killers, history and statistics of earlier searches."
+        self.killer_moves = {}  # ply -> most recent killer moves, newest first
+        self.history_scores = {}  # move -> accumulated cutoff weight
+        self.cutoffs = {}  # ply -> number of cutoffs
+        self.first_move_cutoffs = {}  # ply -> cutoffs caused by the first move tried
+
+    def order(self, moves, ply, num_cols=None) :
+        """Given the moves at a node, in generation order, return the list of
+        their indexes in the order they should be searched. Column moves are
+        only ordered center-first if num_cols is given."""
+        killers = self.killer_moves.get(ply, []) if self.killers else []
+        def priority(index) :
+            move = moves[index]
+            return ((killers.index(move) if move in killers else len(killers)),
+                    -self.history_scores.get(move, 0) if self.history else 0,
+                    abs(move - (num_cols - 1) / 2.0) if self.center and num_cols else 0)
+        return sorted(range(len(moves)), key=priority)
+
+    def record_cutoff(self, move, ply, depth, first_move=False) :
+        """Record that move caused a cutoff at the given ply, with depth levels
+        of search left below it."""
+        self.cutoffs[ply] = self.cutoffs.get(ply, 0) + 1
+        if first_move :
+            self.first_move_cutoffs[ply] = self.first_move_cutoffs.get(ply, 0) + 1
+        if self.killers :
+            killers = [move] + [m for m in self.killer_moves.get(ply, []) if m != move]
+            self.killer_moves[ply] = killers[:self.num_killers]
+        if self.history :
+            weight = depth * depth if depth != float('inf') else 1
+            self.history_scores[move] = self.history_scores.get(move, 0) + weight
+
+    def __str__(self) :
+        total = sum(self.cutoffs.values())
+        first = sum(self.first_move_cutoffs.values())
+        return ("<MoveOrdering center=%s killers=%s history=%s: %i cutoffs, %i on the first move>"
+                % (self.center, self.killers, self.history, total, first))
+    __repr__ = __str__
+
+class SearchTimeout(Exception) :
+    """Raised by a search that runs past its deadline. partial_result is the
+    best (path, score, number of evaluations) found before stopping, or None.
+    num_evals is the number of evaluations made before stopping."""
+    def __init__(self, partial_result=None, num_evals=0) :
+        super().__init__("search ran out of time")
+        self.partial_result = partial_result
+        self.num_evals = num_evals
+
+ZOBRIST_TABLES = {}
+
+def get_zobrist_table(num_rows, num_cols):
+    """Return the Zobrist numbers for a board size, as two lists (one per
+    piece type) indexed by bitboard bit. The numbers come from a fixed seed,
+    so keys are the same in every process and can be stored on disk."""
+    if (num_rows, num_cols) not in ZOBRIST_TABLES:
+        rng = Random("zobrist %d x %d" % (num_rows, num_cols))
+        num_bits = num_cols * (num_rows + 1)
+        ZOBRIST_TABLES[(num_rows, num_cols)] = [[rng.getrandbits(64) for i in range(num_bits)]
+                                                for piece_type in (1, 2)]
+    return ZOBRIST_TABLES[(num_rows, num_cols)]
+
+MIRROR_ZOBRIST_TABLES = {}
+
+def get_mirror_zobrist_table(num_rows, num_cols):
+    """Return the Zobrist numbers of the mirror image of each cell, indexed
+    like get_zobrist_table, so that the key of a board's mirror image can be
+    kept up to date alongside its own key."""
+    if (num_rows, num_cols) not in MIRROR_ZOBRIST_TABLES:
+        zobrist = get_zobrist_table(num_rows, num_cols)
+        height = num_rows + 1
+        mirror_index = [(num_cols - 1 - index // height) * height + index % height
+                        for index in range(num_cols * height)]
+        MIRROR_ZOBRIST_TABLES[(num_rows, num_cols)] = [[numbers[mirror_index[index]]
+                                                        for index in range(num_cols * height)]
+                                                       for numbers in zobrist]
+    return MIRROR_ZOBRIST_TABLES[(num_rows, num_cols)]
+
+# The geometry of a board size: the shift that steps to the next cell in each
+# direction, every window of four cells in a row, and the windows through
+# each cell
+LineTables = namedtuple('LineTables', ['shifts', 'windows', 'cell_windows'])
+
+LINE_TABLES = {}
+
+def get_line_tables(num_rows, num_cols):
+    """Return the LineTables for a board size, computing them the first time.
+    shifts holds the bit shifts to the next cell horizontally, vertically,
+    northeast and northwest. windows holds the mask of every four cells in a
+    row (69 on a 6x7 board), and cell_windows[i] the windows containing bit i."""
+    if (num_rows, num_cols) not in LINE_TABLES:
+        height = num_rows + 1
+        shifts = (height, 1, height + 1, height - 1)
+        # (column step, row step) for each shift, with rows counted upward
+        steps = ((1, 0), (0, 1), (1, 1), (1, -1))
+        windows = []
+        cell_windows = [[] for i in range(num_cols * height)]
+        for col_step, row_step in steps :
+            for col in range(num_cols) :
+                for row in range(num_rows) :
+                    cells = [(col + i * col_step, row + i * row_step) for i in range(4)]
+                    if all(0 <= c < num_cols and 0 <= r < num_rows for c, r in cells) :
+                        window = sum(1 << (c * height + r) for c, r in cells)
+                        windows.append(window)
+                        for c, r in cells :
+                            cell_windows[c * height + r].append(window)
+        LINE_TABLES[(num_rows, num_cols)] = LineTables(shifts, windows, cell_windows)
+    return LINE_TABLES[(num_rows, num_cols)]
+
+class BitboardGeometry :
+    """Bitboard arithmetic for positions on boards of one size, each held as
+    (position, mask): the pieces of the player to move and all the pieces,
+    laid out as in ConnectFourBoard. Get it from get_bitboard_geometry rather
+    than making one."""
+
+    def __init__(self, num_rows, num_cols) :
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.num_cells = num_rows * num_cols
+        self.height = num_rows + 1
+        self.shifts = get_line_tables(num_rows, num_cols).shifts
+        self.bottom_mask = sum(1 << (col * self.height) for col in range(num_cols))
+        self.board_mask = self.bottom_mask * ((1 << num_rows) - 1)
+        self.column_masks = [((1 << num_rows) - 1) << (col * self.height)
+                             for col in range(num_cols)]
+
+    def key(self, position, mask) :
+        """Return a number that is different for every position: the player's
+        pieces, plus a bit just above the top piece of each column."""
+        return position + mask + self.bottom_mask
+
+    def decode(self, key) :
+        "Return the (position, mask) that key was made from."
+        column_bits = (1 << self.height) - 1
+        mask = 0
+        for col in range(self.num_cols) :
+            top = ((key >> (col * self.height)) & column_bits).bit_length() - 1
+            mask |= ((1 << top) - 1) << (col * self.height)
+        return key & mask, mask
+
+    def mirror(self, bits) :
+        "Return a mask or key mirrored left to right."
+        column_bits = (1 << self.height) - 1
+        mirrored = 0
+        for col in range(self.num_cols) :
+            column = (bits >> (col * self.height)) & column_bits
+            mirrored |= column << ((self.num_cols - 1 - col) * self.height)
+        return mirrored
+
+    def canonical_key(self, position, mask) :
+        "Return the smaller of the keys of a position and its mirror image."
+        key = self.key(position, mask)
+        return min(key, self.mirror(key))
+
+    def is_win(self, position) :
+        "Return True if the pieces in position include four in a row."
+        for shift in self.shifts :
+            pairs = position & (position >> shift)
+            if pairs & (pairs >> (2 * shift)) :
+                return True
+        return False
+
+    def playable(self, mask) :
+        "Return the cells a piece could be put in next, one per open column."
+        return (mask + self.bottom_mask) & self.board_mask
+
+    def moves(self, mask) :
+        "Return the cell each move would fill, one per column with room."
+        playable = self.playable(mask)
+        return [playable & column_mask for column_mask in self.column_masks
+                if playable & column_mask]
+
+    def board_position(self, board) :
+        "Return (position, mask) for a ConnectFourBoard."
+        current_piece_type = [1, 2][board.count_pieces() % 2]
+        return board.piece_masks[current_piece_type - 1], board.occupied_mask
+
+BITBOARD_GEOMETRIES = {}
+
+def get_bitboard_geometry(num_rows, num_cols):
+    "Return the BitboardGeometry for a board size, making it the first time."
+    if (num_rows, num_cols) not in BITBOARD_GEOMETRIES:
+        BITBOARD_GEOMETRIES[(num_rows, num_cols)] = BitboardGeometry(num_rows, num_cols)
+    return BITBOARD_GEOMETRIES[(num_rows, num_cols)]
+
+if hasattr(int, 'bit_count') :
+    def popcount(mask):
+        "Return the number of set bits in a non-negative integer bitmask."
+        return mask.bit_count()
+else :
+    def popcount(mask):
+        "Return the number of set bits in a non-negative integer bitmask."
+        return bin(mask).count("1")
 
 def is_class_instance(obj, class_name):
     return hasattr(obj, '__class__') and obj.__class__.__name__ == class_name
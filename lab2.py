@@ -18,44 +18,48 @@ INF = float('inf')
 
 def is_game_over_connectfour(board):
   """Returns True if game is over, otherwise False."""
-  if board.count_pieces() == 42:
-    return True
-
-  chains = board.get_all_chains()
-  for chain in chains:
-    if(len(chain) >= 4):
-      return True
-
-  return False
+  return board.is_game_over()
 
 
 def next_boards_connectfour(board):
   """Returns a list of ConnectFourBoard objects that could result from the
   next move, or an empty list if no moves can be made."""
+  return [apply_move_connectfour(board, col) for col in next_moves_connectfour(board)]
+
+
+def next_moves_connectfour(board):
+  """Returns the columns that the next piece could be put in, or an empty list
+  if no moves can be made."""
   moves = []
   if(is_game_over_connectfour(board)):
     return moves
 
   for i in range(7):
     if(not board.is_column_full(i)):
-      moves.append(board.add_piece(i))
+      moves.append(i)
 
   return moves
 
 
+def apply_move_connectfour(board, col):
+  """Returns a new ConnectFourBoard with the next piece put in column col."""
+  return board.add_piece(col)
+
+
+def has_next_boards_connectfour(board):
+  """Returns True if next_boards_connectfour(board) would return any boards,
+  without making them: a board that is not over has a column with room."""
+  return not is_game_over_connectfour(board)
+
+
 def endgame_score_connectfour(board, is_current_player_maximizer):
   """Given an endgame board, returns 1000 if the maximizer has won,
   -1000 if the minimizer has won, or 0 in case of a tie."""
-  playerChains = board.get_all_chains(is_current_player_maximizer)
-  otherChains = board.get_all_chains(not is_current_player_maximizer)
-
-  for chain in playerChains:
-    if(len(chain) >= 4):
-      return 1000
+  if board.has_four_in_a_row(is_current_player_maximizer):
+    return 1000
 
-  for chain in otherChains:
-    if(len(chain) >= 4):
-      return -1000
+  if board.has_four_in_a_row(not is_current_player_maximizer):
+    return -1000
 
   return 0
 
@@ -65,6 +69,16 @@ def endgame_score_connectfour_faster(board, is_current_player_maximizer):
   returning larger absolute scores for winning sooner."""
   return endgame_score_connectfour(board, is_current_player_maximizer) * (42 / board.count_pieces())
 
+# The shortcuts that let a search tell whether a board is over and make next
+# boards one at a time. GameRules made with next_boards_connectfour pick them up.
+next_boards_connectfour.has_next_states_fn = has_next_boards_connectfour
+next_boards_connectfour.next_moves_fn = next_moves_connectfour
+next_boards_connectfour.apply_move_fn = apply_move_connectfour
+
+# The rules shared by the Connect Four states below
+CONNECT_FOUR_RULES = GameRules(is_game_over_connectfour, next_boards_connectfour,
+                               endgame_score_connectfour_faster)
+
 # Now we can create AbstractGameState objects for Connect Four, using some of
 # the functions you implemented above.  You can use the following examples to
 # test your dfs and minimax implementations in Part 2.
@@ -72,21 +86,15 @@ def endgame_score_connectfour_faster(board, is_current_player_maximizer):
 
 # This AbstractGameState represents a new ConnectFourBoard, before the game has started:
 state_starting_connectfour = AbstractGameState(snapshot=ConnectFourBoard(),
-                                               is_game_over_fn=is_game_over_connectfour,
-                                               generate_next_states_fn=next_boards_connectfour,
-                                               endgame_score_fn=endgame_score_connectfour_faster)
+                                               rules=CONNECT_FOUR_RULES)
 
 # This AbstractGameState represents the ConnectFourBoard "NEARLY_OVER" from boards.py:
 state_NEARLY_OVER = AbstractGameState(snapshot=NEARLY_OVER,
-                                      is_game_over_fn=is_game_over_connectfour,
-                                      generate_next_states_fn=next_boards_connectfour,
-                                      endgame_score_fn=endgame_score_connectfour_faster)
+                                      rules=CONNECT_FOUR_RULES)
 
 # This AbstractGameState represents the ConnectFourBoard "BOARD_UHOH" from boards.py:
 state_UHOH = AbstractGameState(snapshot=BOARD_UHOH,
-                               is_game_over_fn=is_game_over_connectfour,
-                               generate_next_states_fn=next_boards_connectfour,
-                               endgame_score_fn=endgame_score_connectfour_faster)
+                               rules=CONNECT_FOUR_RULES)
 
 
 #### Part 2: Searching a Game Tree #############################################
@@ -123,13 +131,15 @@ def dfs_maximizing(state):
 # pretty_print_dfs_type(dfs_maximizing(GAME1))
 
 
-def minimax_endgame_search(state, maximize=True):
+def minimax_endgame_search(state, maximize=True, tablebase=None):
   """Performs minimax search, searching all leaf nodes and statically
   evaluating all endgame scores.  Returns the same as dfs_maximizing:
   a tuple containing:
    0. the best path (a list of AbstractGameState objects),
    1. the score of the leaf node (a number), and
-   2. the number of static evaluations performed (a number)"""
+   2. the number of static evaluations performed (a number)
+  If a Tablebase (see tablebase.py) is given, positions below the root that
+  it holds are scored from it instead of being searched."""
   best_score = None
   path = []
   num_evals = 0
@@ -139,7 +149,8 @@ def minimax_endgame_search(state, maximize=True):
   else:
     moves = state.generate_next_states()
     for move in moves:
-      next_move = minimax_endgame_search(move, not maximize)
+      next_move = (tablebase_result(tablebase, move, not maximize)
+                   or minimax_endgame_search(move, not maximize, tablebase))
       num_evals += next_move[2]
 
       if best_score == None or (maximize and next_move[1] > best_score) or (not maximize and next_move[1] < best_score):
@@ -149,6 +160,17 @@ def minimax_endgame_search(state, maximize=True):
 
   return (path, best_score, num_evals)
 
+def tablebase_result(tablebase, state, maximize):
+  """Returns ([state], score, 1) if tablebase (a Tablebase from tablebase.py,
+  or None) has the exact score of state, otherwise None. Its scores are the
+  endgame scores of endgame_score_connectfour_faster with perfect play."""
+  if tablebase is None:
+    return None
+  score = tablebase.probe_score(state.get_snapshot(), maximize)
+  if score is None:
+    return None
+  return ([state], score, 1)
+
 # Uncomment the line below to try your minimax_endgame_search on an
 # AbstractGameState representing the ConnectFourBoard "NEARLY_OVER" from boards.py:
 
@@ -162,30 +184,23 @@ def heuristic_connectfour(board, is_current_player_maximizer):
   """Given a non-endgame board, returns a heuristic score with
   abs(score) < 1000, where higher numbers indicate that the board is better
   for the maximizer."""
-  heuristic = 0
-  player_chains = board.get_all_chains(is_current_player_maximizer)
-  other_chains = board.get_all_chains(not is_current_player_maximizer)
-
-  for p_chain in player_chains:
-    if len(p_chain) == 3:
-      heuristic += 25
-
-  for o_chain in other_chains:
-    if len(o_chain) == 3:
-      heuristic -= 25
-
+  analysis = board.get_analysis()
+  heuristic = 25 * analysis.count_chains(is_current_player_maximizer, 3)
+  heuristic -= 25 * analysis.count_chains(not is_current_player_maximizer, 3)
   return heuristic
 
 # Note that the signature of heuristic_fn is heuristic_fn(board, maximize=True)
 
 
-def minimax_search(state, heuristic_fn=always_zero, depth_limit=INF, maximize=True):
+def minimax_search(state, heuristic_fn=always_zero, depth_limit=INF, maximize=True,
+                   tablebase=None):
   """Performs h-minimax, cutting off search at depth_limit and using heuristic_fn
   to evaluate non-terminal states.
   Same return type as dfs_maximizing, a tuple containing:
    0. the best path (a list of AbstractGameState objects),
    1. the score of the leaf node (a number), and
-   2. the number of static evaluations performed (a number)"""
+   2. the number of static evaluations performed (a number)
+  tablebase is as for minimax_endgame_search."""
   best_score = None
   path = []
   num_evals = 0
@@ -197,7 +212,8 @@ def minimax_search(state, heuristic_fn=always_zero, depth_limit=INF, maximize=Tr
   else:
     moves = state.generate_next_states()
     for move in moves:
-      next_move = minimax_search(move, heuristic_fn, depth_limit - 1, not maximize)
+      next_move = (tablebase_result(tablebase, move, not maximize)
+                   or minimax_search(move, heuristic_fn, depth_limit - 1, not maximize, tablebase))
       num_evals += next_move[2]
 
       if best_score == None or (maximize and next_move[1] > best_score) or (not maximize and next_move[1] < best_score):
@@ -214,25 +230,209 @@ def minimax_search(state, heuristic_fn=always_zero, depth_limit=INF, maximize=Tr
 
 
 def minimax_search_alphabeta(state, alpha=-INF, beta=INF, heuristic_fn=always_zero,
-                             depth_limit=INF, maximize=True):
+                             depth_limit=INF, maximize=True, transposition_table=None,
+                             move_ordering=None, principal_variation=None,
+                             root_move_scores=None, deadline=None, time_check_interval=64,
+                             symmetric_root=False, tablebase=None, stop_flag=None,
+                             root_window=None):
   """"Performs minimax with alpha-beta pruning.
   Same return type as dfs_maximizing, a tuple containing:
    0. the best path (a list of AbstractGameState objects),
    1. the score of the leaf node (a number), and
-   2. the number of static evaluations performed (a number)"""
+   2. the number of static evaluations performed (a number)
+  If a TranspositionTable is given, positions it already holds a deep enough
+  result for are not searched again (the path then stops at that position),
+  and the best move it recorded for a position is searched first. Games
+  whose positions have no key (see AbstractGameState.has_key) are searched
+  without the table.
+  A MoveOrdering, if given, decides the order of the remaining moves.
+  principal_variation is a list of moves (see get_previous_move) to search
+  first, one per ply, for as long as the search stays on it.
+  root_move_scores is a dict from root move to score. The root moves it
+  already scores are searched best first, and it is updated with the scores
+  found by this search.
+  If a deadline (in seconds, as returned by time()) is given, the clock is
+  checked every time_check_interval nodes, and SearchTimeout is raised once
+  the deadline has passed. Its partial_result holds the best result among the
+  root moves searched completely, or None if there were none or the root
+  moves were not ordered by a principal variation or root_move_scores.
+  If symmetric_root is True and the root is its own mirror image, only one of
+  each pair of mirror image root moves is searched, since both score the same.
+  If a Tablebase (see tablebase.py) is given, positions below the root that it
+  holds get their exact scores from it and are not searched, whatever the
+  depth left.
+  stop_flag is an object with an is_set() method, such as a threading.Event
+  or a parallel_search.SharedFlag. It is checked along with the deadline, and
+  the search raises SearchTimeout once it is set, so another thread or
+  process can stop the search.
+  root_window is an object with a narrow(alpha, beta) method that returns a
+  narrower window, such as a parallel_search.SharedBound. After each root
+  move, the window is narrowed with it, so that a bound found elsewhere while
+  this search runs (by a process searching a brother of the root, say)
+  prunes the rest of the root moves too."""
+  if not state.has_key():
+    transposition_table = None
+  options = SearchOptions(heuristic_fn, transposition_table, move_ordering,
+                          principal_variation, root_move_scores, deadline,
+                          time_check_interval, symmetric_root, tablebase, stop_flag,
+                          root_window)
+  return alphabeta_search_node(state, alpha, beta, depth_limit, maximize, 0, True, options)
+
+
+class SearchOptions:
+  """The settings shared by every node of one minimax_search_alphabeta call."""
+
+  def __init__(self, heuristic_fn=always_zero, transposition_table=None,
+               move_ordering=None, principal_variation=None, root_move_scores=None,
+               deadline=None, time_check_interval=64, symmetric_root=False,
+               tablebase=None, stop_flag=None, root_window=None):
+    self.heuristic_fn = heuristic_fn
+    self.transposition_table = transposition_table
+    self.move_ordering = move_ordering
+    self.principal_variation = principal_variation or []
+    self.root_move_scores = root_move_scores
+    self.deadline = deadline
+    self.time_check_interval = time_check_interval
+    self.symmetric_root = symmetric_root
+    self.tablebase = tablebase
+    self.stop_flag = stop_flag
+    self.root_window = root_window
+    self.num_nodes = 0
+
+  def needs_checks(self):
+    "Returns True if the search has a deadline or a stop flag to check."
+    return self.deadline is not None or self.stop_flag is not None
+
+  def check_time(self):
+    "Counts a node, and raises SearchTimeout if it is time to stop."
+    self.num_nodes += 1
+    if self.num_nodes % self.time_check_interval == 0:
+      if ((self.deadline is not None and time() >= self.deadline)
+          or (self.stop_flag is not None and self.stop_flag.is_set())):
+        raise SearchTimeout()
+
+  def orders_moves(self):
+    "Returns True if any setting needs to know which move leads to each child."
+    return (self.transposition_table is not None or self.move_ordering is not None
+            or bool(self.principal_variation) or self.root_move_scores is not None)
+
+
+def order_moves(state, moves, maximize, ply, on_pv, table_move, options):
+  """Returns the identifiers of the given moves from state (see get_move_id)
+  and the order in which to search the children, as a list
+  of indexes. The principal variation goes first, then the transposition
+  table's best move, then the root moves by score from the last search, then
+  whatever the MoveOrdering decides."""
+  # moves without an identifier of their own go by generation order
+  move_ids = [index if state.get_move_id(move) is None else state.get_move_id(move)
+              for index, move in enumerate(moves)]
+  indexes = list(range(len(moves)))
+  if options.move_ordering is not None:
+    indexes = options.move_ordering.order(move_ids, ply,
+                                          getattr(state.get_snapshot(), 'num_cols', None))
+  if ply == 0 and options.root_move_scores:
+    scores = options.root_move_scores
+    scored = sorted([index for index in indexes if move_ids[index] in scores],
+                    key=lambda index: scores[move_ids[index]], reverse=maximize)
+    indexes = scored + [index for index in indexes if move_ids[index] not in scores]
+  first_moves = []
+  if table_move is not None:
+    first_moves.append(table_move)
+  if on_pv and ply < len(options.principal_variation):
+    first_moves.append(options.principal_variation[ply])
+  for move in first_moves:
+    if move in move_ids:
+      indexes.remove(move_ids.index(move))
+      indexes.insert(0, move_ids.index(move))
+  return move_ids, indexes
+
+
+def alphabeta_search_node(state, alpha, beta, depth_limit, maximize, ply, on_pv, options):
+  """Searches the subtree below state for minimax_search_alphabeta. ply is the
+  number of moves from the root of the search, and on_pv is True if every move
+  so far followed the principal variation."""
   best_score = None
   path = []
   num_evals = 0
-
-  if state.is_game_over():
-    return ([state], state.get_endgame_score(maximize), 1)
-  elif depth_limit == 0:
-    return ([state], heuristic_fn(state.get_snapshot(), maximize), 1)
+  table = options.transposition_table
+  ordering = options.move_ordering
+  entry = None
+  table_move = None
+
+  if options.needs_checks():
+    options.check_time()
+
+  # never cut off at the root, which has to return a path to a move
+  if ply > 0 and options.tablebase is not None:
+    result = tablebase_result(options.tablebase, state, maximize)
+    if result is not None:
+      return result
+
+  if table is not None:
+    if table.canonical:
+      # a position and its mirror image share an entry, stored the way round
+      # that has the canonical key, so moves are mirrored in and out
+      key = state.canonical_key()
+      mirrored = key != state.key()
+    else:
+      key, mirrored = state.key(), False
+    entry = table.probe(key, maximize)
+    if entry is not None and entry.best_move is not None:
+      table_move = state.mirror_move(entry.best_move) if mirrored else entry.best_move
+    # never cut off at the root, which has to return a path to a move
+    if entry is not None and ply > 0 and entry.depth >= depth_limit:
+      if entry.bound == EXACT:
+        return ([state], entry.score, 0)
+      elif entry.bound == LOWER_BOUND:
+        alpha = max(alpha, entry.score)
+      else:
+        beta = min(beta, entry.score)
+      if alpha >= beta:
+        return ([state], entry.score, 0)
+
+  if state.is_game_over() or depth_limit == 0:
+    if state.is_game_over():
+      # endgame scores hold however deep the search goes
+      score, score_depth = state.get_endgame_score(maximize), INF
+    else:
+      score, score_depth = options.heuristic_fn(state.get_snapshot(), maximize), 0
+    if table is not None:
+      table.store(key, score_depth, score, EXACT, None, maximize)
+    return ([state], score, 1)
   else:
-    moves = state.generate_next_states()
-    for move in moves:
-      next_move = minimax_search_alphabeta(move, alpha, beta, heuristic_fn, depth_limit - 1, not maximize)
+    window = (alpha, beta)
+    # each child is only built when the search gets to it, so a cutoff saves
+    # building the ones after it
+    moves = state.generate_next_moves()
+    if ply == 0 and options.symmetric_root and state.is_symmetric():
+      # mirror image moves lead to mirror image positions, which score the same
+      moves = [move for move in moves
+               if state.get_move_id(move) <= state.mirror_move(state.get_move_id(move))]
+    indexes = range(len(moves))
+    pv_move = None
+    if options.orders_moves():
+      move_ids, indexes = order_moves(state, moves, maximize, ply, on_pv, table_move, options)
+      if on_pv and ply < len(options.principal_variation):
+        pv_move = options.principal_variation[ply]
+    best_index = None
+    for index in indexes:
+      next_state = state.make_move(moves[index])
+      try:
+        next_move = alphabeta_search_node(next_state, alpha, beta, depth_limit - 1,
+                                          not maximize, ply + 1,
+                                          pv_move is not None and move_ids[index] == pv_move,
+                                          options)
+      except SearchTimeout as timeout:
+        timeout.num_evals += num_evals
+        # without the level before to order the root moves, the first moves
+        # searched are arbitrary, so their best is no better a guess
+        if ply == 0 and best_score is not None and (options.principal_variation
+                                                    or options.root_move_scores):
+          timeout.partial_result = (path, best_score, num_evals)
+        raise
       num_evals += next_move[2]
+      if ply == 0 and options.root_move_scores is not None:
+        options.root_move_scores[move_ids[index]] = next_move[1]
 
       if maximize:
         if next_move[1] > alpha:
@@ -243,11 +443,33 @@ def minimax_search_alphabeta(state, alpha=-INF, beta=INF, heuristic_fn=always_ze
 
       if best_score == None or (maximize and next_move[1] > best_score) or (not maximize and next_move[1] < best_score):
         best_score = next_move[1]
+        best_index = index
         path = next_move[0]
         path.insert(0, state)
 
       if alpha >= beta:
-        return (path, best_score, num_evals)
+        if ordering is not None:
+          ordering.record_cutoff(move_ids[index], ply, depth_limit, index == indexes[0])
+        break
+
+      if ply == 0 and options.root_window is not None:
+        # the scores found from here on are only good within the narrower
+        # window, which is what the table entry has to go by
+        window = options.root_window.narrow(*window)
+        alpha, beta = max(alpha, window[0]), min(beta, window[1])
+        if alpha >= beta:
+          break
+
+  if table is not None and best_score is not None:
+    if best_score <= window[0]:
+      bound = UPPER_BOUND
+    elif best_score >= window[1]:
+      bound = LOWER_BOUND
+    else:
+      bound = EXACT
+    best_move = move_ids[best_index]
+    table.store(key, depth_limit, best_score, bound,
+                state.mirror_move(best_move) if mirrored else best_move, maximize)
 
   return (path, best_score, num_evals)
 
@@ -259,19 +481,61 @@ def minimax_search_alphabeta(state, alpha=-INF, beta=INF, heuristic_fn=always_ze
 #pretty_print_dfs_type(minimax_search_alphabeta(state_UHOH, heuristic_fn=heuristic_connectfour, depth_limit=4))
 
 def progressive_deepening(state, heuristic_fn=always_zero, depth_limit=INF,
-                          maximize=True, time_limit=INF):
+                          maximize=True, time_limit=INF, transposition_table=None,
+                          move_ordering=None, reuse_principal_variation=False,
+                          time_check_interval=64, symmetric_root=False, tablebase=None,
+                          stop_flag=None):
   """Runs minimax with alpha-beta pruning. At each level, updates anytime_value
   with the tuple returned from minimax_search_alphabeta.
-  Returns anytime_value."""
+  Returns anytime_value.
+  A TranspositionTable, if given, is shared by all the levels, so each level
+  starts from the results and best moves of the shallower ones. So are the
+  killer moves and history of a MoveOrdering, if given.
+  If reuse_principal_variation is True, each level searches the best path of
+  the level before first, and orders the root moves by their scores in the
+  level before.
+  Every level after the first stops as soon as time_limit runs out (the clock
+  is checked every time_check_interval nodes). The levels completed are kept
+  in the history. When the root moves are ordered by the level before and the
+  interrupted level had finished at least one of them, its best result so far
+  becomes the value too (see AnytimeValue.set_partial_value).
+  symmetric_root and tablebase are passed on to minimax_search_alphabeta.
+  So is stop_flag, which stops every level, the first one included, as soon
+  as it is set."""
   anytime_value = AnytimeValue()
   start_time = time()
   depth = 1
+  if transposition_table is not None:
+    transposition_table.new_search()
+  if move_ordering is not None:
+    move_ordering.new_search()
+  principal_variation = None
+  root_move_scores = {} if reuse_principal_variation else None
 
   while time() - start_time < time_limit:
     if depth == depth_limit + 1:
       break
-    minimax_tup = minimax_search_alphabeta(state, heuristic_fn=heuristic_fn, depth_limit=depth, maximize=maximize)
+    # the first level always completes, so that there is a move to make
+    deadline = start_time + time_limit if depth > 1 and time_limit != INF else None
+    try:
+      minimax_tup = minimax_search_alphabeta(state, heuristic_fn=heuristic_fn, depth_limit=depth, maximize=maximize,
+                                             transposition_table=transposition_table,
+                                             move_ordering=move_ordering,
+                                             principal_variation=principal_variation,
+                                             root_move_scores=root_move_scores,
+                                             deadline=deadline,
+                                             time_check_interval=time_check_interval,
+                                             symmetric_root=symmetric_root,
+                                             tablebase=tablebase,
+                                             stop_flag=stop_flag)
+    except SearchTimeout as timeout:
+      if timeout.partial_result is not None:
+        anytime_value.set_partial_value(timeout.partial_result)
+      anytime_value.add_evaluations(timeout.num_evals)
+      break
     anytime_value.set_value(minimax_tup)
+    if reuse_principal_variation:
+      principal_variation = [move.get_previous_move() for move in minimax_tup[0][1:]]
     depth += 1
 
   return anytime_value
@@ -0,0 +1,173 @@
+# AI Lab 2: Games and ConnectFour
+
+# An opening book: the best move and value of every position in the first few
+# moves of a game, worked out ahead of time and stored in a file.
+#
+# The file is a header followed by fixed-size records (position key, move,
+# value) sorted by key, so a lookup is a binary search through a memory map of
+# the file, with nothing to read or parse when it is opened. Positions are
+# stored under their canonical key (see ConnectFourBoard.canonical_key), so a
+# position and its mirror image share a record, and the move is mirrored back
+# when a position is looked up the other way round.
+#
+# Run from the lab directory to build a book, for example:
+#     python opening_book.py opening_book.bin --ply 4 --depth 6
+#     python opening_book.py opening_book.bin --ply 2 --solve
+
+import mmap
+import struct
+from argparse import ArgumentParser
+from collections import namedtuple
+from time import time
+
+from game_api import *
+from lab2 import (CONNECT_FOUR_RULES, heuristic_connectfour, minimax_search_alphabeta)
+
+MAGIC = b'C4BOOK1\0'
+# magic, number of rows, number of columns, number of moves covered, number of records
+HEADER = struct.Struct('<8sBBBxI')
+# canonical key, best move (in the canonical orientation), value
+RECORD = struct.Struct('<QBh')
+
+# move is a column, and value is the score of the position for the player
+# whose turn it is (from whatever evaluated the book)
+BookEntry = namedtuple('BookEntry', ['move', 'value'])
+
+
+class OpeningBook :
+    """An opening book file opened for lookups. Close it when done, or use it
+    in a with statement."""
+
+    def __init__(self, path) :
+        self.path = path
+        self.file = open(path, 'rb')
+        try :
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.num_rows, self.num_cols, self.max_ply, self.count = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC :
+                raise ValueError(path + " is not an opening book.")
+            if len(self.data) != HEADER.size + self.count * RECORD.size :
+                raise ValueError(path + " is the wrong size for its " + str(self.count) + " records.")
+        except :
+            self.file.close()
+            raise
+
+    def lookup(self, board) :
+        """Return the BookEntry for the board, with the move turned to match
+        the board, or None if the book does not have the position."""
+        if board.num_rows != self.num_rows or board.num_cols != self.num_cols :
+            return None
+        key = board.canonical_key()
+        low, high = 0, self.count
+        while low < high :
+            middle = (low + high) // 2
+            record_key, move, value = RECORD.unpack_from(self.data, HEADER.size + middle * RECORD.size)
+            if record_key < key :
+                low = middle + 1
+            elif record_key > key :
+                high = middle
+            else :
+                if key != board.key() :
+                    move = board.mirror_move(move)
+                return BookEntry(move, value)
+        return None
+
+    def __len__(self) :
+        return self.count
+
+    def close(self) :
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc_info) :
+        self.close()
+
+
+def book_positions(max_ply) :
+    """Yield one board for each canonical position that can be reached in at
+    most max_ply moves from the empty board and is not over, fewest moves first."""
+    layer = [ConnectFourBoard()]
+    for ply in range(max_ply + 1) :
+        next_layer = {}
+        for board in layer :
+            yield board
+            if ply == max_ply :
+                continue
+            for col in range(board.num_cols) :
+                if not board.is_column_full(col) :
+                    next_board = board.add_piece(col)
+                    if (not next_board.is_game_over()
+                        and next_board.canonical_key() not in next_layer) :
+                        next_layer[next_board.canonical_key()] = next_board
+        layer = list(next_layer.values())
+
+def search_evaluator(depth_limit=6, heuristic_fn=heuristic_connectfour) :
+    """Return a function that evaluates a board by alpha-beta search to
+    depth_limit, returning (best column, score for the player to move)."""
+    transposition_table = TranspositionTable()
+    move_ordering = MoveOrdering()
+    def evaluate(board) :
+        transposition_table.new_search()
+        move_ordering.new_search()
+        path, score, evals = minimax_search_alphabeta(AbstractGameState(board, rules=CONNECT_FOUR_RULES),
+                                                      heuristic_fn=heuristic_fn, depth_limit=depth_limit,
+                                                      transposition_table=transposition_table,
+                                                      move_ordering=move_ordering, symmetric_root=True)
+        return path[1].get_previous_move(), round(score)
+    return evaluate
+
+def solver_evaluator() :
+    """Return a function that evaluates a board exactly with the Solver,
+    returning (best column, solver score for the player to move). This is
+    only quick enough for books of a few moves."""
+    from solver import Solver
+    solver = Solver()
+    def evaluate(board) :
+        results = solver.solve_moves(board)
+        col = solver.best_move(board)
+        return col, results[col].score
+    return evaluate
+
+def build_book(path, max_ply, evaluate=None, verbose=False) :
+    """Evaluate every position in the first max_ply moves (see book_positions)
+    with evaluate(board) -> (column, value), which defaults to
+    search_evaluator(), and write the book to path. Returns the number of
+    positions written."""
+    evaluate = evaluate or search_evaluator()
+    records = []
+    start_time = time()
+    for board in book_positions(max_ply) :
+        col, value = evaluate(board)
+        if board.canonical_key() != board.key() :
+            col = board.mirror_move(col)
+        value = max(-2**15, min(2**15 - 1, int(value)))
+        records.append((board.canonical_key(), col, value))
+        if verbose and len(records) % 100 == 0 :
+            print(str(len(records)) + " positions in " + "{0:.1f}".format(time() - start_time) + " s")
+    records.sort()
+    with open(path, 'wb') as book_file :
+        book_file.write(HEADER.pack(MAGIC, ConnectFourBoard.num_rows, ConnectFourBoard.num_cols,
+                                    max_ply, len(records)))
+        for record in records :
+            book_file.write(RECORD.pack(*record))
+    return len(records)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Build an opening book of the first moves of Connect Four.")
+    parser.add_argument('path', help="file to write the book to")
+    parser.add_argument('--ply', type=int, default=4,
+                        help="number of moves from the empty board to cover (default 4)")
+    parser.add_argument('--depth', type=int, default=6,
+                        help="alpha-beta search depth for each position (default 6)")
+    parser.add_argument('--solve', action='store_true',
+                        help="solve each position exactly instead of searching (slow)")
+    args = parser.parse_args()
+    evaluate = solver_evaluator() if args.solve else search_evaluator(args.depth)
+    start_time = time()
+    count = build_book(args.path, args.ply, evaluate, verbose=True)
+    print("Wrote " + str(count) + " positions to " + args.path + " in "
+          + "{0:.1f}".format(time() - start_time) + " s")
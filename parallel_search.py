@@ -0,0 +1,596 @@
+# AI Lab 2: Games and ConnectFour
+
+# Alpha-beta search in several processes at once.
+#
+# parallel_search_alphabeta splits the root moves across a pool of processes.
+# Each move from the root is searched in a worker process by
+# minimax_search_alphabeta. No more moves are handed out than there are
+# workers, and the rest wait until a result comes in, so each one starts with
+# the best bound found so far (alpha when maximizing, beta when minimizing).
+# The bound is also kept in shared memory (see SharedBound), and the searches
+# already running narrow their window to it between the moves at their own
+# root. Within one of those moves, though, a search goes on with the bound it
+# had, so it can still search more than it would have one after another.
+#
+# lazy_smp_search (Lazy SMP) instead runs progressive_deepening on the whole
+# tree in every worker, each trying moves in a slightly different order, and
+# shares one SharedTranspositionTable between them, so each worker finds much
+# of the tree already searched by the others.
+#
+# ybwc_search_alphabeta (Young Brothers Wait) splits the tree at the nodes a
+# few plies down. At each, it searches the eldest child first, in this
+# process, and only then hands its younger brothers to the workers, with the
+# bound the eldest found. If one of them causes a cutoff, the rest are stopped.
+#
+# Everything sent to a worker is pickled: the game states (made from
+# module-level functions, such as the ones in lab2.py) and heuristic_fn, which
+# has to be a module-level function too, not a lambda.
+
+import math
+import os
+import struct
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import resource_tracker, shared_memory
+from random import Random
+from time import time
+
+from game_api import *
+from lab2 import INF, minimax_search_alphabeta, progressive_deepening
+
+# The transposition tables of a worker process, kept from one task to the next
+# and keyed by (heuristic_fn, size in MB), since scores from one heuristic are
+# no use to another
+WORKER_TABLES = {}
+
+
+def search_subtree(state, alpha, beta, heuristic_fn, depth_limit, maximize,
+                   table_size_mb=None, deadline=None, stop_flag=None, shared_bound=None) :
+    """Search one move in a worker process. Returns the (path, score, number
+    of evaluations) of minimax_search_alphabeta, and the narrowest (alpha,
+    beta) window it searched with after narrowing it to shared_bound, a
+    SharedBound of the parent, if given."""
+    table = None
+    if table_size_mb :
+        table = WORKER_TABLES.get((heuristic_fn, table_size_mb))
+        if table is None :
+            table = WORKER_TABLES[(heuristic_fn, table_size_mb)] = TranspositionTable(table_size_mb)
+    try :
+        result = minimax_search_alphabeta(state, alpha, beta, heuristic_fn, depth_limit, maximize,
+                                          transposition_table=table, deadline=deadline,
+                                          stop_flag=stop_flag, root_window=shared_bound)
+    finally :
+        if shared_bound is not None :
+            shared_bound.close()
+    if shared_bound is not None and shared_bound.narrowed is not None :
+        alpha, beta = shared_bound.narrowed
+    return result, (alpha, beta)
+
+def search_children(state, moves, indexes, alpha, beta, heuristic_fn, depth_limit, maximize,
+                    executor, max_workers, results, bounds, table_size_mb=None,
+                    deadline=None, stop_flag=None, on_result=None) :
+    """Search the children of state made by moves[index], for each index in
+    order, in worker processes. No more than max_workers are handed out at
+    once, each with the best bound found so far, which the ones running also
+    pick up through a SharedBound. The result of each child and the bound
+    (alpha or beta) it was searched with in the end are put in the dicts
+    results and bounds, by index, and on_result(index, result) is called as
+    each comes in. Once alpha >= beta, no more children are handed out; if
+    stop_flag is given, it is then set to stop the ones still running, and
+    they are waited for. Returns the number of evaluations those made, and
+    the number of children that were stopped or never started. Children that
+    finish before they see the flag count towards the evaluations but not
+    the children stopped."""
+    pending = {}
+    lost_evals = 0
+    waiting = list(indexes)
+    shared_bound = SharedBound(maximize, alpha if maximize else beta)
+    try :
+        while waiting or pending :
+            while waiting and len(pending) < max_workers and (alpha < beta or not bounds) :
+                index = waiting.pop(0)
+                bounds[index] = alpha if maximize else beta
+                future = executor.submit(search_subtree, state.make_move(moves[index]), alpha, beta,
+                                         heuristic_fn, depth_limit - 1, not maximize,
+                                         table_size_mb, deadline, stop_flag, shared_bound)
+                pending[future] = index
+            if not pending :
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done :
+                index = pending.pop(future)
+                results[index], window = future.result()
+                bounds[index] = window[0] if maximize else window[1]
+                if on_result is not None :
+                    on_result(index, results[index])
+                if maximize :
+                    alpha = max(alpha, results[index][1])
+                else :
+                    beta = min(beta, results[index][1])
+                shared_bound.improve(results[index][1])
+            if alpha >= beta :
+                # cut off: the rest of the children cannot change the result
+                break
+    finally :
+        num_stopped = len(waiting)
+        for future in pending :
+            future.cancel()
+        if pending and stop_flag is not None :
+            stop_flag.set()
+            wait(pending)
+            for future in pending :
+                if future.cancelled() :
+                    num_stopped += 1
+                elif isinstance(future.exception(), SearchTimeout) :
+                    lost_evals += future.exception().num_evals
+                    num_stopped += 1
+                elif future.exception() is None :
+                    lost_evals += future.result()[0][2]
+        shared_bound.close()
+    return lost_evals, num_stopped
+
+def parallel_search_alphabeta(state, alpha=-INF, beta=INF, heuristic_fn=always_zero,
+                              depth_limit=INF, maximize=True, executor=None,
+                              max_workers=None, root_move_scores=None, deadline=None,
+                              symmetric_root=False, table_size_mb=None) :
+    """Performs minimax with alpha-beta pruning, like minimax_search_alphabeta,
+    with the moves from the root searched in parallel. Returns the same tuple
+    (best path, score, number of evaluations); the evaluations are the total
+    over all the workers.
+    executor is a pool from start_pool to use, or None to start one with
+    max_workers processes (by default, one per CPU) for this search alone.
+    max_workers is also the number of moves searched at once.
+    root_move_scores and symmetric_root are as for minimax_search_alphabeta:
+    the root moves are handed out best score first, and the scores are
+    updated as they come in.
+    If table_size_mb is given, each worker process keeps a TranspositionTable
+    of that size from one task to the next.
+    If deadline (as returned by time()) is given, SearchTimeout is raised once
+    it has passed. Its partial_result is as for minimax_search_alphabeta."""
+    if state.is_game_over() or depth_limit == 0 :
+        return minimax_search_alphabeta(state, alpha, beta, heuristic_fn, depth_limit, maximize)
+    max_workers = max_workers or os.cpu_count() or 1
+    if executor is None :
+        with start_pool(max_workers) as executor :
+            return parallel_search_alphabeta(state, alpha, beta, heuristic_fn, depth_limit,
+                                             maximize, executor, max_workers, root_move_scores,
+                                             deadline, symmetric_root, table_size_mb)
+
+    moves = state.generate_next_moves()
+    move_ids = [state.get_move_id(move) for move in moves]
+    indexes = list(range(len(moves)))
+    if symmetric_root and state.is_symmetric() :
+        indexes = [index for index in indexes
+                   if move_ids[index] <= state.mirror_move(move_ids[index])]
+    if root_move_scores :
+        scored = sorted([index for index in indexes if move_ids[index] in root_move_scores],
+                        key=lambda index: root_move_scores[move_ids[index]], reverse=maximize)
+        indexes = scored + [index for index in indexes if move_ids[index] not in root_move_scores]
+
+    def record_score(index, result) :
+        if root_move_scores is not None and move_ids[index] is not None :
+            root_move_scores[move_ids[index]] = result[1]
+    results = {}
+    bounds = {}
+    try :
+        search_children(state, moves, indexes, alpha, beta, heuristic_fn, depth_limit, maximize,
+                        executor, max_workers, results, bounds, table_size_mb, deadline,
+                        on_result=record_score)
+    except SearchTimeout as timeout :
+        # the evaluations of the children that finished, along with those of
+        # the one that ran out of time (the others are not waited for)
+        timeout.num_evals += sum(result[2] for result in results.values())
+        if results and root_move_scores :
+            timeout.partial_result = best_child_result(state, results, bounds, indexes, maximize)
+        raise
+    return best_child_result(state, results, bounds, indexes, maximize)
+
+def best_child_result(state, results, bounds, indexes, maximize) :
+    """Return (path from state, score, evaluations) for the best of the
+    results of the children of state. Of children with the same score, one
+    that beat the bound it was searched with wins (the others may only be
+    bounds), then the one first in indexes."""
+    order = {index: position for position, index in enumerate(indexes)}
+    sign = 1 if maximize else -1
+    best_index = max(results, key=lambda index: (sign * results[index][1],
+                                                 sign * (results[index][1] - bounds[index]) > 0,
+                                                 -order[index]))
+    path, score, evals = results[best_index]
+    num_evals = sum(result[2] for result in results.values())
+    return ([state] + path, score, num_evals)
+
+def parallel_progressive_deepening(state, heuristic_fn=always_zero, depth_limit=INF,
+                                   maximize=True, time_limit=INF, max_workers=None,
+                                   table_size_mb=None) :
+    """Runs parallel_search_alphabeta to depth 1, 2, ... and returns an
+    AnytimeValue, like progressive_deepening. One pool of max_workers
+    processes is used for every level, and each level hands out the root
+    moves best first by their scores in the level before. Every level after
+    the first stops as soon as time_limit runs out."""
+    anytime_value = AnytimeValue()
+    start_time = time()
+    root_move_scores = {}
+    max_workers = max_workers or os.cpu_count() or 1
+    with start_pool(max_workers) as executor :
+        depth = 1
+        while depth <= depth_limit and time() - start_time < time_limit :
+            deadline = start_time + time_limit if depth > 1 and time_limit != INF else None
+            try :
+                result = parallel_search_alphabeta(state, heuristic_fn=heuristic_fn,
+                                                   depth_limit=depth, maximize=maximize,
+                                                   executor=executor, max_workers=max_workers,
+                                                   root_move_scores=root_move_scores,
+                                                   deadline=deadline, table_size_mb=table_size_mb)
+            except SearchTimeout as timeout :
+                if timeout.partial_result is not None :
+                    anytime_value.set_partial_value(timeout.partial_result)
+                anytime_value.add_evaluations(timeout.num_evals)
+                break
+            anytime_value.set_value(result)
+            depth += 1
+    return anytime_value
+
+
+if hasattr(math, 'nextafter') :
+    def score_toward(score, target) :
+        "Return the next float after score in the direction of target."
+        return math.nextafter(score, target)
+else :
+    def score_toward(score, target) :
+        "Without math.nextafter (before Python 3.9), bounds are not narrowed."
+        return target
+
+def start_pool(max_workers) :
+    """Start a ProcessPoolExecutor of max_workers processes for the searches
+    here. The resource tracker is started first, so that the workers share it
+    (see attach_shared_memory)."""
+    resource_tracker.ensure_running()
+    return ProcessPoolExecutor(max_workers)
+
+def attach_shared_memory(name) :
+    """Open a block of shared memory made by another process. Only the process
+    that made it unlinks it. Before Python 3.13, opening a block registers it
+    with the resource tracker, which unlinks the blocks still registered when
+    it shuts down. The workers of a pool from start_pool share the tracker of
+    the process that made the block, which unregisters it when it unlinks it;
+    a worker with a tracker of its own would unlink the block when it exits."""
+    try :
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError :
+        return shared_memory.SharedMemory(name)
+
+class SharedFlag :
+    """A flag in shared memory that any process can set, such as the
+    stop_flag of minimax_search_alphabeta. Pickling it (to send to a worker)
+    sends its name, and the copy reads and writes the same byte. The process
+    that made it should close() it when done."""
+
+    def __init__(self, name=None) :
+        self.owner = name is None
+        self.block = shared_memory.SharedMemory(create=True, size=1) if self.owner else attach_shared_memory(name)
+
+    def set(self) :
+        self.block.buf[0] = 1
+
+    def clear(self) :
+        self.block.buf[0] = 0
+
+    def is_set(self) :
+        return self.block.buf[0] == 1
+
+    def close(self) :
+        self.block.close()
+        if self.owner :
+            self.block.unlink()
+
+    def __reduce__(self) :
+        return (SharedFlag, (self.block.name,))
+
+class SharedBound :
+    """The best score found so far at a node whose children are searched in
+    worker processes (alpha if it is maximizing, beta if not), in shared
+    memory. The process that made it improves it as results come in, and
+    the workers pass it to minimax_search_alphabeta as root_window. Pickling
+    it sends its name, and the copy reads the same score. Every process
+    should close() it when done; the one that made it also unlinks it.
+
+    The score is stored with a check word, the bits of the score XORed with
+    a constant, so that a read in the middle of a write, which mixes two
+    scores, is noticed and ignored."""
+
+    value_struct = struct.Struct('<dQ')
+    score_struct = struct.Struct('<d')
+    score_bits_struct = struct.Struct('<Q')
+    check_mask = 0x5a5a5a5a5a5a5a5a
+
+    def __init__(self, maximize, bound, name=None) :
+        self.maximize = maximize
+        self.owner = name is None
+        # the narrowest window given out by narrow() in this process
+        self.narrowed = None
+        if self.owner :
+            self.block = shared_memory.SharedMemory(create=True, size=self.value_struct.size)
+            self.bound = None
+            self.improve(bound)
+        else :
+            self.block = attach_shared_memory(name)
+
+    def improve(self, score) :
+        "Set the bound to score if score is better."
+        if (self.bound is not None
+            and (score <= self.bound if self.maximize else score >= self.bound)) :
+            return
+        self.bound = score
+        score_bits, = self.score_bits_struct.unpack(self.score_struct.pack(score))
+        self.value_struct.pack_into(self.block.buf, 0, score, score_bits ^ self.check_mask)
+
+    def get(self) :
+        "Return the bound, or None if it is being written."
+        score, check = self.value_struct.unpack_from(self.block.buf, 0)
+        score_bits, = self.score_bits_struct.unpack_from(self.block.buf, 0)
+        if score_bits ^ self.check_mask != check :
+            return None
+        return score
+
+    def narrow(self, alpha, beta) :
+        """Return the window (alpha, beta) narrowed to just short of the bound:
+        alpha raised if the node is maximizing, beta lowered if not. Stopping
+        short lets a child that ties with the best so far still find its exact
+        score, so that ties are settled as they would be one after another."""
+        bound = self.get()
+        if bound is not None :
+            if self.maximize :
+                alpha = max(alpha, score_toward(bound, -INF))
+            else :
+                beta = min(beta, score_toward(bound, INF))
+        self.narrowed = (alpha, beta)
+        return alpha, beta
+
+    def close(self) :
+        self.block.close()
+        if self.owner :
+            self.block.unlink()
+
+    def __reduce__(self) :
+        return (SharedBound, (self.maximize, None, self.block.name))
+
+class SharedTranspositionTable(TranspositionTable) :
+    """A TranspositionTable in shared memory, which processes can use at the
+    same time without locks. Pickling it (to send to a worker) sends its name,
+    and the copy uses the same entries. The process that made it should
+    close() it when done.
+
+    Each entry is three 64-bit words: the score, the rest of the entry packed
+    into one word, and the key XORed with both. Two processes may write an
+    entry at once and leave a mix of both; the key then no longer checks out,
+    and the entry is treated as empty. Keys are taken modulo 2**64, and the
+    generation modulo 2**16."""
+
+    entry_bytes = 24
+    entry_struct = struct.Struct('<QdQ')
+    score_struct = struct.Struct('<d')
+    score_bits_struct = struct.Struct('<Q')
+    bounds = (EXACT, LOWER_BOUND, UPPER_BOUND)
+    no_move = 0xffff
+    max_depth = 0xff  # stands for an infinite depth
+
+    def __init__(self, size_mb=16, replacement='depth', canonical=True, name=None) :
+        if replacement not in self.replacement_policies :
+            raise ValueError("Unknown replacement policy " + str(replacement)
+                             + ", expected one of " + str(self.replacement_policies))
+        self.size_mb = size_mb
+        self.replacement = replacement
+        self.canonical = canonical
+        self.owner = name is None
+        if self.owner :
+            capacity = max(1, int(size_mb * 2**20) // self.entry_bytes)
+            self.block = shared_memory.SharedMemory(create=True, size=capacity * self.entry_bytes)
+            self.block.buf[:capacity * self.entry_bytes] = bytes(capacity * self.entry_bytes)
+        else :
+            self.block = attach_shared_memory(name)
+        self.capacity = max(1, int(size_mb * 2**20) // self.entry_bytes)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def probe(self, key, maximize=True) :
+        "Return the TableEntry stored for this position, or None."
+        self.probes += 1
+        entry = self.__read__(key % self.capacity)
+        if entry is None or entry.key != key % 2**64 or entry.maximize != maximize :
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, score, bound, best_move=None, maximize=True) :
+        index = key % self.capacity
+        if self.replacement == 'depth' :
+            old = self.__read__(index)
+            if (old is not None and old.key != key % 2**64
+                and old.generation == self.generation % 2**16 and old.depth > depth) :
+                return
+        self.stores += 1
+        packed = (1 | (bool(maximize) << 1) | (self.bounds.index(bound) << 2)
+                  | ((self.max_depth if depth == INF else min(depth, self.max_depth - 1)) << 4)
+                  | ((self.no_move if best_move is None else best_move) << 12)
+                  | ((self.generation % 2**16) << 28))
+        score_bits, = self.score_bits_struct.unpack(self.score_struct.pack(score))
+        self.entry_struct.pack_into(self.block.buf, index * self.entry_bytes,
+                                    (key % 2**64) ^ score_bits ^ packed, score, packed)
+
+    def __read__(self, index) :
+        """Return the TableEntry in a slot, or None if it is empty or was
+        written by two processes at once."""
+        checked_key, score, packed = self.entry_struct.unpack_from(self.block.buf, index * self.entry_bytes)
+        if not packed & 1 :
+            return None
+        score_bits, = self.score_bits_struct.unpack(self.score_struct.pack(score))
+        if score.is_integer() :
+            # integer scores are stored as floats
+            score = int(score)
+        depth = (packed >> 4) & 0xff
+        best_move = (packed >> 12) & 0xffff
+        return TableEntry(checked_key ^ score_bits ^ packed, INF if depth == self.max_depth else depth,
+                          score, self.bounds[(packed >> 2) & 3],
+                          None if best_move == self.no_move else best_move,
+                          bool(packed & 2), packed >> 28)
+
+    def __len__(self) :
+        return sum(1 for index in range(self.capacity)
+                   if self.block.buf[index * self.entry_bytes + 16] & 1)
+
+    def close(self) :
+        self.block.close()
+        if self.owner :
+            self.block.unlink()
+
+    def __reduce__(self) :
+        return (SharedTranspositionTable, (self.size_mb, self.replacement, self.canonical, self.block.name),
+                {'generation': self.generation})
+
+class PerturbedMoveOrdering(MoveOrdering) :
+    """A MoveOrdering that now and then swaps two neighbouring moves at random,
+    so that the helper workers of lazy_smp_search go through the tree in
+    different orders."""
+
+    def __init__(self, seed, swap_probability=0.25, **kwargs) :
+        self.rng = Random(seed)
+        self.swap_probability = swap_probability
+        super().__init__(**kwargs)
+
+    def order(self, moves, ply, num_cols=None) :
+        indexes = super().order(moves, ply, num_cols)
+        for position in range(len(indexes) - 1) :
+            if self.rng.random() < self.swap_probability :
+                indexes[position], indexes[position + 1] = indexes[position + 1], indexes[position]
+        return indexes
+
+def lazy_smp_worker(state, heuristic_fn, depth_limit, maximize, time_limit, table,
+                    stop_flag, worker) :
+    """Run progressive_deepening in a worker process of lazy_smp_search. Worker
+    0 orders moves as usual and is never stopped by stop_flag; the others
+    (the helpers) order them differently and stop when it is set."""
+    if worker == 0 :
+        move_ordering, stop_flag = MoveOrdering(), None
+    else :
+        move_ordering = PerturbedMoveOrdering(seed=worker)
+    return progressive_deepening(state, heuristic_fn, depth_limit, maximize, time_limit,
+                                 transposition_table=table, move_ordering=move_ordering,
+                                 reuse_principal_variation=True, stop_flag=stop_flag)
+
+def lazy_smp_search(state, heuristic_fn=always_zero, depth_limit=INF, maximize=True,
+                    time_limit=INF, num_workers=None, table_size_mb=16) :
+    """Runs progressive_deepening in num_workers processes at once (by
+    default, one per CPU), all sharing one SharedTranspositionTable of
+    table_size_mb, and returns the AnytimeValue of worker 0. The helper
+    workers are stopped as soon as worker 0 is done."""
+    num_workers = num_workers or os.cpu_count() or 1
+    table = SharedTranspositionTable(table_size_mb)
+    stop_flag = SharedFlag()
+    try :
+        with start_pool(num_workers) as executor :
+            futures = [executor.submit(lazy_smp_worker, state, heuristic_fn, depth_limit, maximize,
+                                       time_limit, table, stop_flag, worker)
+                       for worker in range(num_workers)]
+            try :
+                return futures[0].result()
+            finally :
+                stop_flag.set()
+    finally :
+        table.close()
+        stop_flag.close()
+
+class SplitOptions :
+    """The settings shared by every node of one ybwc_search_alphabeta call."""
+
+    def __init__(self, heuristic_fn, executor, max_workers, split_plies, min_split_depth,
+                 deadline, stats) :
+        self.heuristic_fn = heuristic_fn
+        self.executor = executor
+        self.max_workers = max_workers
+        self.split_plies = split_plies
+        self.min_split_depth = min_split_depth
+        self.deadline = deadline
+        self.stats = stats
+
+def ybwc_search_alphabeta(state, alpha=-INF, beta=INF, heuristic_fn=always_zero,
+                          depth_limit=INF, maximize=True, executor=None, max_workers=None,
+                          split_plies=2, min_split_depth=3, deadline=None, stats=None) :
+    """Performs minimax with alpha-beta pruning, like minimax_search_alphabeta,
+    splitting the search across processes by Young Brothers Wait. Returns the
+    same tuple (best path, score, number of evaluations); the evaluations are
+    the total over all the processes.
+    This process searches the first split_plies - 1 plies one node at a time,
+    eldest child first. The nodes it reaches at the ply after those, with at
+    least min_split_depth levels left below them, are split points: the
+    eldest child is searched first, in this process, and the others are then
+    handed to the workers (at most max_workers at once) with the bound the
+    eldest child found. As soon as one of them causes a cutoff, the ones still
+    running are stopped. Below that, minimax_search_alphabeta searches each
+    subtree as usual.
+    executor, max_workers and deadline are as for parallel_search_alphabeta.
+    The evaluations include those made by younger brothers still running at
+    a cutoff, whether they were stopped or finished first, which are the work
+    lost to searching them before the cutoff was known.
+    If stats is a dict, 'split_points', 'aborted' and 'aborted_evals' in it
+    are increased by the number of split points, of younger brothers stopped
+    or never started because of a cutoff, and of the evaluations lost to
+    the brothers still running at a cutoff."""
+    max_workers = max_workers or os.cpu_count() or 1
+    if executor is None :
+        with start_pool(max_workers) as executor :
+            return ybwc_search_alphabeta(state, alpha, beta, heuristic_fn, depth_limit, maximize,
+                                         executor, max_workers, split_plies, min_split_depth,
+                                         deadline, stats)
+    if stats is None :
+        stats = {}
+    stats.setdefault('split_points', 0)
+    stats.setdefault('aborted', 0)
+    stats.setdefault('aborted_evals', 0)
+    options = SplitOptions(heuristic_fn, executor, max_workers, split_plies, min_split_depth,
+                           deadline, stats)
+    return ybwc_search_node(state, alpha, beta, depth_limit, maximize, 0, options)
+
+def ybwc_search_node(state, alpha, beta, depth_limit, maximize, ply, options) :
+    "Searches the subtree below state for ybwc_search_alphabeta."
+    if (ply >= options.split_plies or depth_limit < options.min_split_depth
+        or state.is_game_over()) :
+        return minimax_search_alphabeta(state, alpha, beta, options.heuristic_fn, depth_limit,
+                                        maximize, deadline=options.deadline)
+    moves = state.generate_next_moves()
+    bounds = {0: alpha if maximize else beta}
+    results = {0: ybwc_search_node(state.make_move(moves[0]), alpha, beta, depth_limit - 1,
+                                   not maximize, ply + 1, options)}
+    if maximize :
+        alpha = max(alpha, results[0][1])
+    else :
+        beta = min(beta, results[0][1])
+    lost_evals = 0
+    if ply + 1 < options.split_plies :
+        # the younger brothers are split points too, so this process
+        # searches them one at a time, each with its own brothers in parallel
+        for index in range(1, len(moves)) :
+            if alpha >= beta :
+                break
+            bounds[index] = alpha if maximize else beta
+            results[index] = ybwc_search_node(state.make_move(moves[index]), alpha, beta,
+                                              depth_limit - 1, not maximize, ply + 1, options)
+            if maximize :
+                alpha = max(alpha, results[index][1])
+            else :
+                beta = min(beta, results[index][1])
+    elif alpha < beta and len(moves) > 1 :
+        options.stats['split_points'] += 1
+        stop_flag = SharedFlag()
+        try :
+            lost_evals, num_stopped = search_children(state, moves, range(1, len(moves)), alpha, beta,
+                                                      options.heuristic_fn, depth_limit, maximize,
+                                                      options.executor, options.max_workers, results,
+                                                      bounds, deadline=options.deadline,
+                                                      stop_flag=stop_flag)
+        finally :
+            stop_flag.close()
+        options.stats['aborted'] += num_stopped
+        options.stats['aborted_evals'] += lost_evals
+    path, score, num_evals = best_child_result(state, results, bounds, range(len(moves)), maximize)
+    return (path, score, num_evals + lost_evals)
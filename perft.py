@@ -0,0 +1,116 @@
+# AI Lab 2: Games and ConnectFour
+
+# Perft ("performance test"): counts the positions reachable in exactly N moves
+# from a position, using nothing but AbstractGameState.is_game_over and
+# generate_next_states. The counts check the move generator and end-of-game
+# detection, and the nodes per second measure their speed apart from search.
+#
+# Run from the lab directory, for example:
+#     python perft.py BOARD_EMPTY 5
+#     python perft.py BOARD_UHOH 4 --divide
+#     python perft.py --check
+
+import sys
+from argparse import ArgumentParser
+from time import time
+
+import boards
+from game_api import *
+from lab2 import CONNECT_FOUR_RULES
+
+# Leaf counts from the empty 6x7 board, by depth. No game can end before the
+# seventh move, so up to depth 6 each is 7**depth. Depth 7 leaves out the 7
+# games that end with four in a single column, and depth 8 is the published
+# count of positions after 8 moves.
+EMPTY_BOARD_COUNTS = [1, 7, 49, 343, 2401, 16807, 117649, 823536, 5673234]
+
+
+def perft(state, depth, visited=None) :
+    """Return the number of positions reached by exactly depth moves from
+    state. Games that end sooner do not reach that depth, so they add 0.
+    If visited is a list [n], n is increased by the number of positions
+    visited along the way, including the inner ones."""
+    if visited is not None :
+        visited[0] += 1
+    if depth == 0 :
+        return 1
+    if state.is_game_over() :
+        return 0
+    return sum(perft(next_state, depth - 1, visited)
+               for next_state in state.generate_next_states())
+
+def perft_divide(state, depth, visited=None) :
+    """Return a list of (move description, perft count) pairs, one for each
+    move from state, where each count is the perft of the move to depth - 1."""
+    if depth < 1 :
+        raise ValueError("perft_divide needs a depth of at least 1.")
+    if visited is not None :
+        visited[0] += 1
+    if state.is_game_over() :
+        return []
+    return [(next_state.describe_previous_move(), perft(next_state, depth - 1, visited))
+            for next_state in state.generate_next_states()]
+
+def timed_perft(state, depth, divide=False) :
+    """Run perft (or perft_divide, if divide is True) and return a tuple
+    (result, number of positions visited, seconds taken)."""
+    visited = [0]
+    start_time = time()
+    result = (perft_divide if divide else perft)(state, depth, visited)
+    return result, visited[0], time() - start_time
+
+def make_state(position) :
+    """Wrap a ConnectFourBoard as an AbstractGameState. AbstractGameStates
+    (such as the ToyTree games) are returned as they are."""
+    if is_AbstractGameState_instance(position) :
+        return position
+    if not is_class_instance(position, 'ConnectFourBoard') :
+        raise TypeError("Expected a ConnectFourBoard or an AbstractGameState, got "
+                        + str(type(position)))
+    return AbstractGameState(snapshot=position, rules=CONNECT_FOUR_RULES)
+
+def check(max_depth=len(EMPTY_BOARD_COUNTS) - 1) :
+    "Compare perft from the empty board with EMPTY_BOARD_COUNTS. Return True if all match."
+    state = make_state(ConnectFourBoard())
+    all_match = True
+    for depth in range(max_depth + 1) :
+        count, visited, seconds = timed_perft(state, depth)
+        expected = EMPTY_BOARD_COUNTS[depth]
+        print(format_report(depth, count, visited, seconds)
+              + ("" if count == expected else "  MISMATCH, expected " + str(expected)))
+        all_match = all_match and count == expected
+    return all_match
+
+def format_report(depth, count, visited, seconds) :
+    rate = visited / seconds if seconds > 0 else float('inf')
+    return ("perft(" + str(depth) + ") = " + str(count) + "  ("
+            + str(visited) + " positions in " + "{0:.3f}".format(seconds)
+            + " s, " + "{0:.0f}".format(rate) + " positions/s)")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Count the positions N moves ahead of a position from boards.py.")
+    parser.add_argument('board', nargs='?', default='BOARD_EMPTY',
+                        help="name of a board or game in boards.py (default BOARD_EMPTY)")
+    parser.add_argument('depth', nargs='?', type=int, default=4,
+                        help="number of moves to look ahead (default 4)")
+    parser.add_argument('--divide', action='store_true',
+                        help="also print the count below each move from the position")
+    parser.add_argument('--check', action='store_true',
+                        help="compare the empty board against the known counts and exit")
+    args = parser.parse_args()
+
+    if args.check :
+        sys.exit(0 if check() else 1)
+
+    if not hasattr(boards, args.board) :
+        parser.error("boards.py has no board named " + args.board)
+    state = make_state(getattr(boards, args.board))
+    print(state.snapshot)
+    if args.divide :
+        divided, visited, seconds = timed_perft(state, args.depth, divide=True)
+        for description, count in divided :
+            print(description + ": " + str(count))
+        print(format_report(args.depth, sum(count for _, count in divided), visited, seconds))
+    else :
+        print(format_report(args.depth, *timed_perft(state, args.depth)))
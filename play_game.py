@@ -173,11 +173,14 @@ class ConnectFourAlphaBetaPlayer(ConnectFourPlayer):
 
 class ConnectFourProgressiveDeepeningPlayer(ConnectFourPlayer):
 
-    def __init__(self, name="ProgressiveDeepening Bot", depth_limit=INF, time_limit=INF, verbose=False):
+    def __init__(self, name="ProgressiveDeepening Bot", depth_limit=INF, time_limit=INF, verbose=False,
+                 opening_book=None):
         self.name = name
         self.depth_limit = depth_limit
         self.time_limit = time_limit
         self.verbose = verbose
+        # an OpeningBook (see opening_book.py) to play from before searching
+        self.opening_book = opening_book
 
         super().__init__()
 
@@ -195,6 +198,9 @@ class ConnectFourProgressiveDeepeningPlayer(ConnectFourPlayer):
         self.verbose = verbose
 
     def player_turn(self, state):
+        book_state = book_move(self.opening_book, state, self.name, self.verbose)
+        if book_state is not None:
+            return book_state
         starttime = time()
         anytime_val = progressive_deepening(state, heuristic_connectfour, self.depth_limit, True, self.time_limit)
         path, score, evals = anytime_val.get_value()
@@ -210,11 +216,17 @@ class ConnectFourProgressiveDeepeningPlayer(ConnectFourPlayer):
 
 class ConnectFourTournamentPlayer(ConnectFourPlayer):
 
-    def __init__(self, name="Tournament Bot", depth_limit=INF, time_limit=INF, verbose=False):
+    def __init__(self, name="Tournament Bot", depth_limit=INF, time_limit=INF, verbose=False,
+                 opening_book=None):
         self.name = name
         self.depth_limit = depth_limit
         self.time_limit = time_limit
         self.verbose = verbose
+        # an OpeningBook (see opening_book.py) to play from before searching
+        self.opening_book = opening_book
+        # kept from move to move, so later searches reuse earlier results
+        self.transposition_table = TranspositionTable()
+        self.move_ordering = MoveOrdering()
 
         super().__init__()
 
@@ -232,8 +244,15 @@ class ConnectFourTournamentPlayer(ConnectFourPlayer):
         self.verbose = verbose
 
     def player_turn(self, state):
+        book_state = book_move(self.opening_book, state, self.name, self.verbose)
+        if book_state is not None:
+            return book_state
         starttime = time()
-        anytime_val = progressive_deepening(state, heuristic_connectfour, self.depth_limit, True, self.time_limit)
+        anytime_val = progressive_deepening(state, heuristic_connectfour, self.depth_limit, True, self.time_limit,
+                                            transposition_table=self.transposition_table,
+                                            move_ordering=self.move_ordering,
+                                            reuse_principal_variation=True,
+                                            symmetric_root=True)
         path, score, evals = anytime_val.get_value()
         new_state = path[1]
 
@@ -245,13 +264,23 @@ class ConnectFourTournamentPlayer(ConnectFourPlayer):
         return new_state
 
 
+def book_move(opening_book, state, name="", verbose=False):
+    """Return the state after the move the opening book gives for state, or
+    None if there is no book or the position is not in it."""
+    if opening_book is None:
+        return None
+    entry = opening_book.lookup(state.get_snapshot())
+    if entry is None:
+        return None
+    if verbose:
+        print(name + " plays column " + str(entry.move) + " from its opening book"
+              + " (board value " + str(entry.value) + ").")
+    return state.wrap(state.get_snapshot().add_piece(entry.move))
+
+
 def new_state(snapshot=None):
     board = ConnectFourBoard() if snapshot is None else snapshot
-    state_starting_connectfour = AbstractGameState(
-        snapshot=board,
-        is_game_over_fn=is_game_over_connectfour,
-        generate_next_states_fn=next_boards_connectfour,
-        endgame_score_fn=endgame_score_connectfour_faster)
+    state_starting_connectfour = AbstractGameState(snapshot=board, rules=CONNECT_FOUR_RULES)
     return state_starting_connectfour
 
 
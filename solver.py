@@ -0,0 +1,241 @@
+# AI Lab 2: Games and ConnectFour
+
+# An exact Connect Four solver: finds the result of any position with perfect
+# play by both players, without a heuristic or a depth limit.
+#
+# It searches with negamax on the board's bitboards, narrowing in on the score
+# with null-window searches, and remembers bounds in a TranspositionTable. The
+# moves that create the most threats are tried first, then the center ones.
+# Moves that let the opponent win at once are never searched.
+#
+# Run from the lab directory, for example:
+#     python solver.py NEARLY_OVER
+#     python solver.py BOARD_UHOH --weak
+
+from argparse import ArgumentParser
+from collections import namedtuple
+from time import time
+
+from game_api import *
+
+WIN = 'win'
+LOSS = 'loss'
+DRAW = 'draw'
+
+# outcome is WIN, LOSS or DRAW for the player whose turn it is. score is
+# positive for a win, negative for a loss and 0 for a draw; the sooner the
+# game ends, the larger its absolute value. distance is the number of moves
+# until the game ends with perfect play (both players win as soon as they can
+# and lose as late as they can). A weak solve only finds the outcome, so its
+# score is just 1, -1 or 0 and its distance is None.
+SolverResult = namedtuple('SolverResult', ['outcome', 'score', 'distance'])
+
+
+class Solver :
+    """Solves positions on boards of one size. The transposition table is kept
+    between calls, so solving positions from the same game gets faster."""
+
+    def __init__(self, num_rows=ConnectFourBoard.num_rows,
+                 num_cols=ConnectFourBoard.num_cols, table_size_mb=64) :
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+        self.num_cells = num_rows * num_cols
+        self.table = TranspositionTable(table_size_mb, canonical=False)
+        self.num_nodes = 0
+        self.geometry = get_bitboard_geometry(num_rows, num_cols)
+        # center columns first
+        self.column_order = sorted(range(num_cols),
+                                   key=lambda col: abs(col - (num_cols - 1) / 2.0))
+
+    def solve(self, board, weak=False) :
+        """Return the SolverResult of the board for the player whose turn it
+        is. A weak solve only finds whether the game is a win, loss or draw,
+        which is much faster."""
+        if board.num_rows != self.num_rows or board.num_cols != self.num_cols :
+            raise ValueError("This solver is for " + str(self.num_rows) + "x"
+                             + str(self.num_cols) + " boards.")
+        moves = board.count_pieces()
+        if board.has_four_in_a_row() :
+            # whoever just moved has won
+            return SolverResult(LOSS, -((self.num_cells + 2 - moves) // 2), 0)
+        if moves == self.num_cells :
+            return SolverResult(DRAW, 0, 0)
+        position, mask = self.geometry.board_position(board)
+        score = self.__solve_score__(position, mask, moves, weak)
+        return self.__result__(score, moves, weak)
+
+    def solve_moves(self, board, weak=False) :
+        """Return a dictionary from each column that can be played to the
+        SolverResult of playing it, for the player whose turn it is."""
+        results = {}
+        if board.is_game_over() :
+            return results
+        for col in range(self.num_cols) :
+            if not board.is_column_full(col) :
+                board.play(col)
+                try :
+                    outcome, score, distance = self.solve(board, weak)
+                finally :
+                    board.undo()
+                results[col] = SolverResult({WIN: LOSS, LOSS: WIN}.get(outcome, DRAW), -score,
+                                            None if distance is None else distance + 1)
+        return results
+
+    def best_move(self, board) :
+        "Return a column that gives the best result for the player whose turn it is."
+        results = self.solve_moves(board)
+        return max(results, key=lambda col: (results[col].score,
+                                             -abs(col - (self.num_cols - 1) / 2.0)))
+
+    def __result__(self, score, moves, weak) :
+        "Turn a score for the player to move after moves moves into a SolverResult."
+        if score == 0 :
+            return SolverResult(DRAW, 0, None if weak else self.num_cells - moves)
+        outcome = WIN if score > 0 else LOSS
+        if weak :
+            return SolverResult(outcome, 1 if score > 0 else -1, None)
+        # a score s means the winner puts in their last piece as their
+        # (num_cells // 2 + 1 - s)th
+        last_piece = self.num_cells // 2 + 1 - abs(score)
+        if score > 0 :
+            # the player to move has put in moves // 2 pieces so far
+            distance = 2 * (last_piece - moves // 2) - 1
+        else :
+            distance = 2 * (last_piece - (moves + 1) // 2)
+        return SolverResult(outcome, score, distance)
+
+    def __solve_score__(self, position, mask, moves, weak) :
+        """Return the score of the position by null-window searches, which
+        bisect the range the score can be in until it is known."""
+        if self.__winning_cells__(position, mask) & self.geometry.playable(mask) :
+            return (self.num_cells + 1 - moves) // 2
+        if weak :
+            low, high = -1, 1
+        else :
+            low, high = -((self.num_cells - moves) // 2), (self.num_cells + 1 - moves) // 2
+        while low < high :
+            middle = low + (high - low) // 2
+            # try near 0 first, where most scores are
+            if middle <= 0 and int(low / 2) < middle :
+                middle = int(low / 2)
+            elif middle >= 0 and int(high / 2) > middle :
+                middle = int(high / 2)
+            score = self.__negamax__(position, mask, moves, middle, middle + 1)
+            if score <= middle :
+                high = score
+            else :
+                low = score
+        return low
+
+    def __negamax__(self, position, mask, moves, alpha, beta) :
+        """Return the score of the position to the player to move (whose pieces
+        are position) if it is between alpha and beta, otherwise a bound on it
+        beyond the one it passed. Assumes the player to move cannot win at once."""
+        self.num_nodes += 1
+        next_moves = self.__non_losing_moves__(position, mask)
+        if next_moves == 0 :
+            # every move lets the opponent win next
+            return -((self.num_cells - moves) // 2)
+        if moves >= self.num_cells - 2 :
+            return 0
+
+        # the opponent cannot win on their next move, so at worst they win later
+        lowest = -((self.num_cells - 2 - moves) // 2)
+        if alpha < lowest :
+            alpha = lowest
+            if alpha >= beta :
+                return alpha
+        # this player cannot win on this move, so at best they win later
+        highest = (self.num_cells - 1 - moves) // 2
+        key = position + mask
+        entry = self.table.probe(key)
+        if entry is not None :
+            if entry.bound == LOWER_BOUND :
+                lowest = entry.score
+                if alpha < lowest :
+                    alpha = lowest
+                    if alpha >= beta :
+                        return alpha
+            else :
+                highest = entry.score
+        if beta > highest :
+            beta = highest
+            if alpha >= beta :
+                return beta
+
+        # most threats created first, then the center columns
+        candidates = []
+        for col in self.column_order :
+            move = next_moves & self.geometry.column_masks[col]
+            if move :
+                threats = popcount(self.__winning_cells__(position | move, mask))
+                candidates.append((-threats, len(candidates), move))
+        candidates.sort()
+
+        opponent = position ^ mask
+        for _, _, move in candidates :
+            score = -self.__negamax__(opponent, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta :
+                self.table.store(key, self.num_cells - moves, score, LOWER_BOUND)
+                return score
+            if score > alpha :
+                alpha = score
+        self.table.store(key, self.num_cells - moves, alpha, UPPER_BOUND)
+        return alpha
+
+    def __winning_cells__(self, position, mask) :
+        """Return the empty cells that would give the pieces in position four in
+        a row, whether or not they can be played yet."""
+        cells = (position << 1) & (position << 2) & (position << 3)
+        shifts = self.geometry.shifts
+        for shift in (shifts[0], shifts[2], shifts[3]) :
+            pairs = (position << shift) & (position << (2 * shift))
+            cells |= pairs & (position << (3 * shift))
+            cells |= pairs & (position >> shift)
+            pairs = (position >> shift) & (position >> (2 * shift))
+            cells |= pairs & (position << shift)
+            cells |= pairs & (position >> (3 * shift))
+        return cells & (self.geometry.board_mask ^ mask)
+
+    def __non_losing_moves__(self, position, mask) :
+        """Return the playable cells that do not let the opponent win on their
+        next move, or 0 if there are none."""
+        playable = self.geometry.playable(mask)
+        opponent_wins = self.__winning_cells__(position ^ mask, mask)
+        forced = playable & opponent_wins
+        if forced :
+            if forced & (forced - 1) :
+                # the opponent has two wins to block
+                return 0
+            playable = forced
+        # never play just below a cell where the opponent would win
+        return playable & ~(opponent_wins >> 1)
+
+
+def solve(board, weak=False) :
+    """Return the SolverResult of the board for the player whose turn it is,
+    using a new Solver."""
+    return Solver(board.num_rows, board.num_cols).solve(board, weak)
+
+
+if __name__ == '__main__':
+    import boards
+    parser = ArgumentParser(description="Solve a board from boards.py with perfect play.")
+    parser.add_argument('board', help="name of a board in boards.py")
+    parser.add_argument('--weak', action='store_true',
+                        help="only find whether it is a win, loss or draw")
+    parser.add_argument('--moves', action='store_true',
+                        help="also solve each move from the board")
+    args = parser.parse_args()
+    if not is_class_instance(getattr(boards, args.board, None), 'ConnectFourBoard') :
+        parser.error("boards.py has no ConnectFourBoard named " + args.board)
+    board = getattr(boards, args.board).copy()
+    solver = Solver()
+    print(board)
+    start_time = time()
+    result = solver.solve(board, args.weak)
+    print(board.get_current_player_name() + ": " + str(result))
+    if args.moves :
+        for col, move_result in sorted(solver.solve_moves(board, args.weak).items()) :
+            print("  col " + str(col) + ": " + str(move_result))
+    print(str(solver.num_nodes) + " positions in " + "{0:.2f}".format(time() - start_time) + " s")
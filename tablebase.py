@@ -0,0 +1,227 @@
+# AI Lab 2: Games and ConnectFour
+
+# An endgame tablebase: the exact result of every position with at most K empty
+# cells that can be reached from a starting position, worked out backwards
+# from the end of the game and stored in a file.
+#
+# Building it takes two passes. The forward pass finds the positions reachable
+# from the start, one layer per number of empty cells, and writes each layer
+# of K or fewer empty cells to a temporary file. The backward pass then works
+# out the layers from 0 empty cells up, each from the one below it, and writes
+# each to the tablebase as soon as it is done. Only one or two layers are ever
+# held in memory, however large K is.
+#
+# The file is a header, the number of positions in each layer, and then the
+# layers in order. Each position is one 8-byte record: its key (see
+# BitboardGeometry.key in game_api.py) above a byte holding the outcome and the number of
+# moves until the game ends, sorted by key within the layer. A lookup goes
+# straight to the position's layer and binary searches it through a memory map.
+#
+# The forward pass has to go through every position between the start and the
+# layers kept, so the start should be no more than a few moves further from
+# the end than K. Run from the lab directory, for example:
+#     python tablebase.py NEARLY_OVER tablebase.bin --empty 5
+
+import mmap
+import os
+import struct
+from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left
+from tempfile import TemporaryDirectory
+from time import time
+
+from game_api import *
+from solver import WIN, LOSS, DRAW, SolverResult
+
+MAGIC = b'C4TBASE1'
+# magic, number of rows, number of columns, largest number of empty cells
+HEADER = struct.Struct('<8sBBB5x')
+LAYER_COUNT = struct.Struct('<I')
+RECORD = struct.Struct('<Q')
+
+# the low two bits of a record's last byte; the rest is the distance
+OUTCOME_CODES = {DRAW: 0, WIN: 1, LOSS: 2}
+OUTCOMES = {code: outcome for outcome, code in OUTCOME_CODES.items()}
+
+
+class Tablebase :
+    """A tablebase file opened for lookups. Close it when done, or use it in a
+    with statement."""
+
+    def __init__(self, path) :
+        self.path = path
+        self.file = open(path, 'rb')
+        try :
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, num_rows, num_cols, self.max_empty = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC :
+                raise ValueError(path + " is not a tablebase.")
+            self.geometry = get_bitboard_geometry(num_rows, num_cols)
+            # where each layer's records start, and how many there are
+            self.layers = []
+            offset = HEADER.size + LAYER_COUNT.size * (self.max_empty + 1)
+            for empty in range(self.max_empty + 1) :
+                count, = LAYER_COUNT.unpack_from(self.data, HEADER.size + LAYER_COUNT.size * empty)
+                self.layers.append((offset, count))
+                offset += count * RECORD.size
+            if len(self.data) != offset :
+                raise ValueError(path + " is the wrong size for its records.")
+        except :
+            self.file.close()
+            raise
+
+    def probe(self, board) :
+        """Return the SolverResult of the board for the player whose turn it
+        is, or None if the tablebase does not have the position (including
+        every position where the game is over)."""
+        geometry = self.geometry
+        if board.num_rows != geometry.num_rows or board.num_cols != geometry.num_cols :
+            return None
+        num_pieces = board.count_pieces()
+        empty = geometry.num_cells - num_pieces
+        if empty > self.max_empty :
+            return None
+        offset, count = self.layers[empty]
+        key = geometry.canonical_key(*geometry.board_position(board))
+        low, high = 0, count
+        while low < high :
+            middle = (low + high) // 2
+            record, = RECORD.unpack_from(self.data, offset + middle * RECORD.size)
+            if record >> 8 < key :
+                low = middle + 1
+            elif record >> 8 > key :
+                high = middle
+            else :
+                outcome, distance = OUTCOMES[record & 3], (record & 0xff) >> 2
+                if outcome == DRAW :
+                    return SolverResult(DRAW, 0, distance)
+                # the number of pieces the winner ends with, as the Solver scores it
+                score = geometry.num_cells // 2 + 1 - (num_pieces + distance + 1) // 2
+                return SolverResult(outcome, score if outcome == WIN else -score, distance)
+        return None
+
+    def probe_score(self, board, is_current_player_maximizer=True) :
+        """Return the score of the board with perfect play, as
+        endgame_score_connectfour_faster (in lab2.py) would score the end of
+        the game, or None if the tablebase does not have the position."""
+        result = self.probe(board)
+        if result is None :
+            return None
+        if result.outcome == DRAW :
+            return 0
+        score = 1000 * (42 / (board.count_pieces() + result.distance))
+        if (result.outcome == WIN) != is_current_player_maximizer :
+            score = -score
+        return score
+
+    def __len__(self) :
+        return sum(count for offset, count in self.layers)
+
+    def close(self) :
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc_info) :
+        self.close()
+
+
+def build_tablebase(board, path, max_empty, verbose=False) :
+    """Work out the result of every position with at most max_empty empty
+    cells that can be reached from board, and write the tablebase to path.
+    Returns the number of positions written. Positions where the game is
+    over are left out, since their endgame scores are known already."""
+    if board.is_game_over() :
+        raise ValueError("The game is already over on this board.")
+    geometry = get_bitboard_geometry(board.num_rows, board.num_cols)
+    start_time = time()
+    with TemporaryDirectory() as layer_dir :
+        layer_path = lambda empty : os.path.join(layer_dir, str(empty))
+
+        # forward: the positions reachable from board, by number of empty cells
+        empty = geometry.num_cells - board.count_pieces()
+        layer = array('Q', [geometry.canonical_key(*geometry.board_position(board))])
+        while layer :
+            if empty <= max_empty :
+                with open(layer_path(empty), 'wb') as layer_file :
+                    layer.tofile(layer_file)
+            if verbose :
+                print(str(empty) + " empty cells: " + str(len(layer)) + " positions")
+            layer = next_layer(geometry, layer)
+            empty -= 1
+
+        # backward: each layer from the results of the one below it
+        num_positions = 0
+        with open(path, 'wb') as tablebase_file :
+            tablebase_file.write(HEADER.pack(MAGIC, board.num_rows, board.num_cols, max_empty))
+            tablebase_file.write(LAYER_COUNT.pack(0) * (max_empty + 1))
+            records = array('Q')
+            for empty in range(max_empty + 1) :
+                layer = array('Q')
+                if os.path.exists(layer_path(empty)) :
+                    with open(layer_path(empty), 'rb') as layer_file :
+                        layer.frombytes(layer_file.read())
+                records = array('Q', [(key << 8) | solve_position(geometry, key, records)
+                                      for key in layer])
+                records.tofile(tablebase_file)
+                tablebase_file.seek(HEADER.size + LAYER_COUNT.size * empty)
+                tablebase_file.write(LAYER_COUNT.pack(len(records)))
+                tablebase_file.seek(0, os.SEEK_END)
+                num_positions += len(records)
+    if verbose :
+        print("Wrote " + str(num_positions) + " positions in "
+              + "{0:.1f}".format(time() - start_time) + " s")
+    return num_positions
+
+def next_layer(geometry, layer) :
+    """Return the sorted keys of the positions one move on from those in
+    layer, leaving out the ones where the game is over."""
+    next_keys = set()
+    for key in layer :
+        position, mask = geometry.decode(key)
+        opponent = position ^ mask
+        for move in geometry.moves(mask) :
+            next_mask = mask | move
+            if not geometry.is_win(position | move) and next_mask != geometry.board_mask :
+                next_keys.add(geometry.canonical_key(opponent, next_mask))
+    return array('Q', sorted(next_keys))
+
+def solve_position(geometry, key, next_records) :
+    """Return the record byte (outcome and distance) of the position with the
+    given key, from next_records, the records of the layer one move on."""
+    position, mask = geometry.decode(key)
+    opponent = position ^ mask
+    best = None
+    for move in geometry.moves(mask) :
+        if geometry.is_win(position | move) :
+            return (1 << 2) | OUTCOME_CODES[WIN]
+        next_mask = mask | move
+        if next_mask == geometry.board_mask :
+            outcome, distance = DRAW, 1
+        else :
+            next_key = geometry.canonical_key(opponent, next_mask)
+            index = bisect_left(next_records, next_key << 8)
+            record = next_records[index]
+            outcome = {WIN: LOSS, LOSS: WIN, DRAW: DRAW}[OUTCOMES[record & 3]]
+            distance = ((record & 0xff) >> 2) + 1
+        # win soonest, else draw, else lose latest
+        rank = {WIN: (2, -distance), DRAW: (1, 0), LOSS: (0, distance)}[outcome]
+        if best is None or rank > best[0] :
+            best = (rank, outcome, distance)
+    return (best[2] << 2) | OUTCOME_CODES[best[1]]
+
+
+if __name__ == '__main__':
+    import boards
+    parser = ArgumentParser(description="Build an endgame tablebase from a board in boards.py.")
+    parser.add_argument('board', help="name of a board in boards.py to start from")
+    parser.add_argument('path', help="file to write the tablebase to")
+    parser.add_argument('--empty', type=int, default=8,
+                        help="largest number of empty cells to cover (default 8)")
+    args = parser.parse_args()
+    if not is_class_instance(getattr(boards, args.board, None), 'ConnectFourBoard') :
+        parser.error("boards.py has no ConnectFourBoard named " + args.board)
+    build_tablebase(getattr(boards, args.board), args.path, args.empty, verbose=True)
@@ -1,11 +1,12 @@
 # AI Lab 2: Games and ConnectFour 
 
-from tester import make_test, get_tests
+from tester import make_test, get_tests, lambda_minus_heur
 from game_api import *
 from boards import *
 from lab2 import (next_boards_connectfour, is_game_over_connectfour,
                   endgame_score_connectfour, endgame_score_connectfour_faster,
-                  minimax_search)
+                  minimax_search, heuristic_connectfour, state_starting_connectfour)
+from time import time
 INF = float('inf')
 lab_number = 2
 
@@ -165,11 +166,50 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           expected_val = "(list containing 1 full ConnectFourBoard with correct attributes)",
           name = 'next_boards_connectfour')
 
+#board where col 4 wins -> playing it in place and undoing it restores the board
+UNDO_BOARD = BOARD_UHOH.add_piece(0)
+def undo_state(board) :
+    return (board.key(), board.mirror_key(), list(board.column_heights),
+            board.has_four_in_a_row(), board.get_current_player_name(),
+            board.describe_previous_move())
+def next_boards_connectfour_6_getargs() :  #TEST 13
+    return [UNDO_BOARD]
+def next_boards_connectfour_6_testanswer(val, original_val = None) :
+    board = UNDO_BOARD.copy()
+    before = undo_state(board)
+    won = board.play(4).has_four_in_a_row() and board == val[4]
+    return (won and undo_state(board.undo()) == before
+            and board == UNDO_BOARD and not board.is_game_over())
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = next_boards_connectfour_6_getargs,
+          testanswer = next_boards_connectfour_6_testanswer,
+          expected_val = ("(list of 7 ConnectFourBoard objects, of which the one "
+                          +"for col 4 has four in a row. Playing col 4 in place "
+                          +"and undoing it should restore the board.)"),
+          name = 'next_boards_connectfour')
+
+#board made from a list of moves -> each next board adds its col to the list
+MOVE_LIST = [3, 3, 2, 4, 4, 1, 5]
+def next_boards_connectfour_7_getargs() :  #TEST 14
+    return [ConnectFourBoard.from_moves(MOVE_LIST)]
+def next_boards_connectfour_7_testanswer(val, original_val = None) :
+    return (ConnectFourBoard.from_moves(MOVE_LIST).get_move_list() == MOVE_LIST
+            and len(val) == 7
+            and all(board.get_move_list() == MOVE_LIST + [col]
+                    and ConnectFourBoard.from_moves(MOVE_LIST + [col]) == board
+                    for col, board in enumerate(val)))
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = next_boards_connectfour_7_getargs,
+          testanswer = next_boards_connectfour_7_testanswer,
+          expected_val = ("(list of 7 ConnectFourBoard objects, each with the "
+                          +"moves of the board plus its own col as its move list)"),
+          name = 'next_boards_connectfour')
+
 
 ## endgame_score_connectfour
 
 #MAX wins -> return 1000
-def endgame_score_connectfour_MAX_getargs() :  #TEST 13
+def endgame_score_connectfour_MAX_getargs() :  #TEST 15
     return [PLAYER_2_ALICE_DOMINATED, False]
 def endgame_score_connectfour_MAX_testanswer(val, original_val = None) :
     return val == 1000
@@ -180,7 +220,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'endgame_score_connectfour')
 
 #MIN wins -> return -1000
-def endgame_score_connectfour_MIN_getargs() :  #TEST 14
+def endgame_score_connectfour_MIN_getargs() :  #TEST 16
     return [PLAYER_ONE1_WON, True]
 def endgame_score_connectfour_MIN_testanswer(val, original_val = None) :
     return val == -1000
@@ -191,7 +231,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'endgame_score_connectfour')
 
 #tie -> return 0
-def endgame_score_connectfour_MIN_getargs() :  #TEST 15
+def endgame_score_connectfour_MIN_getargs() :  #TEST 17
     return [BOARD_FULL_TIED, True]
 def endgame_score_connectfour_MIN_testanswer(val, original_val = None) :
     return val == 0
@@ -205,7 +245,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
 ## endgame_score_connectfour_faster
 
 #compare wins with fewer pieces on board (higher abs score) vs more pieces (lower abs score)
-def endgame_score_connectfour_faster_MIN_getargs() :  #TEST 16
+def endgame_score_connectfour_faster_MIN_getargs() :  #TEST 18
     return [[BOARD_ONEFISH_WON_FAST, True],  # stronger win for MIN (fewer total pieces on board)
             [BOARD_REDFISH_WON_LESS_FAST, True]]  # weaker win for MIN (more total pieces on board)
 def endgame_score_connectfour_faster_MIN_testanswer(val, original_val = None) :
@@ -218,7 +258,7 @@ make_test(type = 'MULTIFUNCTION',
                           +"than the second, and each <= -1000)"),
           name = 'endgame_score_connectfour_faster')
 
-def endgame_score_connectfour_faster_MAX_getargs() :  #TEST 17
+def endgame_score_connectfour_faster_MAX_getargs() :  #TEST 19
     return [[PLAYER_TWO1_WON, False],  # stronger win for MAX (fewer total pieces on board)
             [PLAYER_2_ALICE_DOMINATED, False]]  # weaker win for MAX (more total pieces on board)
 def endgame_score_connectfour_faster_MAX_testanswer(val, original_val = None) :
@@ -235,7 +275,7 @@ make_test(type = 'MULTIFUNCTION',
 ## heuristic_connectfour
 
 # >0 if MAX's turn and MAX winning, val < 1000
-def heuristic_connectfour_0_getargs() :  #TEST 18
+def heuristic_connectfour_0_getargs() :  #TEST 20
     return [BOARD_1_WINNING_BARELY, True]
 def heuristic_connectfour_0_testanswer(val, original_val = None) :
     return isinstance(val, (int, float)) and val > 0 and val < 1000
@@ -246,7 +286,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'heuristic_connectfour')
 
 # >0 if MIN's turn and MAX winning, val < 1000
-def heuristic_connectfour_1_getargs() :  #TEST 19
+def heuristic_connectfour_1_getargs() :  #TEST 21
     return [BOARD_2_WINNING_DEFINITELY, False]
 def heuristic_connectfour_1_testanswer(val, original_val = None) :
     return isinstance(val, (int, float)) and val > 0 and val < 1000
@@ -257,7 +297,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'heuristic_connectfour')
 
 # <0 if MIN's turn and MIN winning, val > -1000
-def heuristic_connectfour_2_getargs() :  #TEST 20
+def heuristic_connectfour_2_getargs() :  #TEST 22
     return [BOARD_1_WINNING_BARELY, False]
 def heuristic_connectfour_2_testanswer(val, original_val = None) :
     return isinstance(val, (int, float)) and val < 0 and val > -1000
@@ -268,7 +308,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'heuristic_connectfour')
 
 # <0 if MAX's turn and MIN winning, val > -1000
-def heuristic_connectfour_3_getargs() :  #TEST 21
+def heuristic_connectfour_3_getargs() :  #TEST 23
     return [BOARD_2_WINNING_LESS_PIECES, True]
 def heuristic_connectfour_3_testanswer(val, original_val = None) :
     return isinstance(val, (int, float)) and val < 0 and val > -1000
@@ -279,7 +319,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'heuristic_connectfour')
 
 # larger score if MAX is winning by more
-def heuristic_connectfour_4_getargs() :  #TEST 22
+def heuristic_connectfour_4_getargs() :  #TEST 24
     return [[BOARD_2_WINNING_DEFINITELY, True],  # MIN winning by a lot
             [BOARD_1_WINNING_BARELY, False],     # MIN winning, barely
             [BOARD_1_WINNING_BARELY, True],      # MAX winning, barely
@@ -298,9 +338,28 @@ make_test(type = 'MULTIFUNCTION',
           name = 'heuristic_connectfour')
 
 
+# BOARD_UHOH: the other player threatens four in a row at the bottom of col 4,
+# and neither player has a chain longer than 2 -> no chains of 3 to score
+def heuristic_connectfour_5_getargs() :  #TEST 25
+    return [BOARD_UHOH, True]
+def heuristic_connectfour_5_testanswer(val, original_val = None) :
+    analysis = BOARD_UHOH.get_analysis()
+    threat = 1 << (4 * (BOARD_UHOH.num_rows + 1))
+    return (val == 0
+            and analysis.get_longest_chain(True) == analysis.get_longest_chain(False) == 2
+            and analysis.get_open_threats(False) == threat
+            and analysis.count_open_threats(False) == 1
+            and analysis.get_open_threats(True) == analysis.count_open_threats(True) == 0)
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = heuristic_connectfour_5_getargs,
+          testanswer = heuristic_connectfour_5_testanswer,
+          expected_val = "0 (no chains of 3 on boards.BOARD_UHOH)",
+          name = 'heuristic_connectfour')
+
+
 ## dfs_maximizing
 
-def dfs_0_getargs() :  #TEST 23
+def dfs_0_getargs() :  #TEST 26
     return [GAME1]
 def dfs_0_testanswer(val, original_val = None) :
     return  (is_dfs_return_type(val) and move_sequence(GAME1, [2,3]) == val[0]
@@ -314,7 +373,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
 
 
 # MINIMAX ENDGAME SEARCH
-def minimax_endgame_0_getargs() :  #TEST 24
+def minimax_endgame_0_getargs() :  #TEST 27
     return [GAME1, True]
 
 def minimax_endgame_0_testanswer(val, original_val = None) :
@@ -327,7 +386,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           expected_val = "List of (best_path, leaf_score, evaluation_count) corresponding to minimax score when the first player is the maximizer.",
           name = 'minimax_endgame_search')
 
-def minimax_endgame_1_getargs() :  #TEST 25
+def minimax_endgame_1_getargs() :  #TEST 28
     return [GAME1, False]
 
 def minimax_endgame_1_testanswer(val, original_val = None) :
@@ -340,7 +399,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           expected_val = "List of (best_path, leaf_score, evaluation_count) corresponding to minimax score when the first player is the minimizer.",
           name = 'minimax_endgame_search')
 
-def minimax_endgame_2_getargs() :  #TEST 26
+def minimax_endgame_2_getargs() :  #TEST 29
     GAME = AbstractGameState(NEARLY_OVER, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
     return [GAME, True]
 
@@ -358,11 +417,107 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
               + "'maximize' with get_endgame_score.",
           name = 'minimax_endgame_search')
 
+# With a tablebase (tablebase.py) of the positions below the root, each move
+# from the root gets its exact score from the tablebase without being
+# searched. The tablebase is built in a temporary directory by testanswer, and
+# the search with it is checked against the search without it.
+def minimax_endgame_3_getargs() :  #TEST 30
+    GAME = AbstractGameState(NEARLY_OVER, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour_faster)
+    return [GAME, True]
+
+def minimax_endgame_3_testanswer(val, original_val = None) :
+    import os
+    from tempfile import TemporaryDirectory
+    from lab2 import minimax_endgame_search
+    from tablebase import Tablebase, build_tablebase
+    GAME = AbstractGameState(NEARLY_OVER, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour_faster)
+    with TemporaryDirectory() as tablebase_dir :
+        path = os.path.join(tablebase_dir, 'tablebase.bin')
+        build_tablebase(NEARLY_OVER, path, 5)
+        with Tablebase(path) as tablebase :
+            result = minimax_endgame_search(GAME, True, tablebase)
+    return (is_dfs_return_type(val) and is_dfs_return_type(result)
+            and abs(val[1] - 1000 * 42 / 39.) < 1e-9 and val[2] == 6
+            and move_sequence(GAME, [1]) == result[0] == val[0][:2]
+            and result[1] == val[1] and result[2] == 2)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = minimax_endgame_3_getargs,
+          testanswer = minimax_endgame_3_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with 6 evaluations. With a tablebase, the search "
+                          +"should find the same leaf_score, with a path that "
+                          +"stops after the first move and only 2 evaluations."),
+          name = 'minimax_endgame_search')
+
+
+# The solver (solver.py) should agree with the endgame search: the same
+# winner, and a distance equal to the number of moves on the best path. A
+# weak solve finds the same outcome, with a score of just 1, -1 or 0.
+def solver_answer(board, val, expected, expected_weak) :
+    from solver import Solver
+    solver = Solver()
+    return (is_dfs_return_type(val)
+            and tuple(solver.solve(board)) == expected
+            and tuple(solver.solve(board, weak=True)) == expected_weak
+            and (expected[0] == 'draw' or len(val[0]) - 1 == expected[2])
+            and (val[1] > 0) - (val[1] < 0) == expected_weak[1])
+
+def solver_1_getargs() :  #TEST 31
+    GAME = AbstractGameState(NEARLY_OVER, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour_faster)
+    return [GAME, True]
+
+def solver_1_testanswer(val, original_val = None) :
+    return solver_answer(NEARLY_OVER, val, ('win', 2, 3), ('win', 1, None))
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = solver_1_getargs,
+          testanswer = solver_1_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with a win in 3 moves, which the solver should find "
+                          +"too: SolverResult('win', 2, 3), or ('win', 1, None) "
+                          +"for a weak solve."),
+          name = 'minimax_endgame_search')
+
+
+def solver_2_getargs() :  #TEST 32
+    GAME = AbstractGameState(NEARLY_OVER.add_piece(5), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour_faster)
+    return [GAME, True]
+
+def solver_2_testanswer(val, original_val = None) :
+    return solver_answer(NEARLY_OVER.add_piece(5), val, ('loss', -2, 2), ('loss', -1, None))
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = solver_2_getargs,
+          testanswer = solver_2_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with a loss in 2 moves, which the solver should find "
+                          +"too: SolverResult('loss', -2, 2), or ('loss', -1, None) "
+                          +"for a weak solve."),
+          name = 'minimax_endgame_search')
+
+
+def solver_3_getargs() :  #TEST 33
+    GAME = AbstractGameState(NEARLY_OVER.add_piece(0), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour_faster)
+    return [GAME, True]
+
+def solver_3_testanswer(val, original_val = None) :
+    return solver_answer(NEARLY_OVER.add_piece(0), val, ('draw', 0, 5), ('draw', 0, None))
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = solver_3_getargs,
+          testanswer = solver_3_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with a draw, which the solver should find too, with "
+                          +"the board full in 5 moves: SolverResult('draw', 0, 5), "
+                          +"or ('draw', 0, None) for a weak solve."),
+          name = 'minimax_endgame_search')
+
 
 # LIMITED DEPTH SEARCH
 
 # This test with depth_limit=INF is just to check use of the argument 'maximize'
-def minimax_1_getargs() :  #TEST 27
+def minimax_1_getargs() :  #TEST 34
     GAME = AbstractGameState(NEARLY_OVER, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
     return [GAME, always_zero, INF, True]
 
@@ -381,7 +536,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'minimax_search')
 
 
-def minimax_2_getargs() :  #TEST 28
+def minimax_2_getargs() :  #TEST 35
     return [GAME_STATIC_ALL_LEVELS, always_zero, 2, True]
 
 def minimax_2_testanswer(val, original_val = None) :
@@ -395,7 +550,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'minimax_search')
 
 
-def minimax_3_getargs() :  #TEST 29
+def minimax_3_getargs() :  #TEST 36
     GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
     valuate = lambda board, player : len(sum(board.get_all_chains(player),[]))
     return [GAME, lambda board,maximize: [-1,1][maximize] * (valuate(board,True) - valuate(board, False)), 2, True]
@@ -415,7 +570,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'minimax_search')
 
 
-def minimax_4_getargs() :  #TEST 30
+def minimax_4_getargs() :  #TEST 37
     GAME = AbstractGameState(BOARD_EMPTY.add_piece(3).add_piece(3), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
     valuate = lambda board, player : len(sum(board.get_all_chains(player),[]))
     density = lambda board, player : sum([abs(index-3)
@@ -443,7 +598,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
 ## minimax_search_alphabeta
 
 #  A two-move game.
-def alphabeta_0_getargs() :  #TEST 31
+def alphabeta_0_getargs() :  #TEST 38
     return [GAME1, -INF, INF, lambda x,y:0, INF, True]
 
 def alphabeta_0_testanswer(val, original_val = None) :
@@ -457,7 +612,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'minimax_search_alphabeta')
 
 
-def alphabeta_1_getargs() :  #TEST 32
+def alphabeta_1_getargs() :  #TEST 39
     return [GAME1, -INF, INF, lambda x,y:0, INF, False]
 
 def alphabeta_1_testanswer(val, original_val = None) :
@@ -474,7 +629,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
 
 
 
-def alphabeta_2_getargs() :  #TEST 33
+def alphabeta_2_getargs() :  #TEST 40
     return [GAME_EQUALITY_PRUNING, -INF, INF, lambda x,y:0, INF, True]
 
 def alphabeta_2_testanswer(val, original_val = None) :
@@ -492,7 +647,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
 
 
 # A test for when the correct move is not just the first available move
-def alphabeta_3_getargs() :  #TEST 34
+def alphabeta_3_getargs() :  #TEST 41
     return [GAME_EQUALITY_PRUNING, -INF, INF, lambda x,y:0, INF, False]
 
 def alphabeta_3_testanswer(val, original_val = None) :
@@ -520,7 +675,7 @@ PRUNING_GAME = AbstractGameState(PRUNING_TREE,
                           toytree_generate_next_states,
                           toytree_endgame_score_fn)
 
-def alphabeta_4_getargs() :  #TEST 35
+def alphabeta_4_getargs() :  #TEST 42
     return [PRUNING_GAME, -INF, INF, toytree_heuristic_fn, INF, True]
 
 def alphabeta_4_testanswer(val, original_val = None) :
@@ -549,7 +704,7 @@ PRUNING_GAME_NEG = AbstractGameState(PRUNING_TREE_NEG,
                           toytree_generate_next_states,
                           toytree_endgame_score_fn)
 
-def alphabeta_5_getargs() :  #TEST 36
+def alphabeta_5_getargs() :  #TEST 43
     return [PRUNING_GAME_NEG, -INF, INF, toytree_heuristic_fn, INF, False]
 
 def alphabeta_5_testanswer(val, original_val = None) :
@@ -576,7 +731,7 @@ NEGATE_GAME = AbstractGameState(NEGATE_TREE,
                           toytree_generate_next_states,
                           NEGATE_GAME_endgame_score_fn)
 
-def alphabeta_6_getargs() :  #TEST 37
+def alphabeta_6_getargs() :  #TEST 44
     return [NEGATE_GAME, -INF, INF, toytree_heuristic_fn, INF, True]
 
 def alphabeta_6_testanswer(val, original_val = None) :
@@ -605,7 +760,7 @@ NONZERO_GAME = AbstractGameState(NONZERO_TREE,
                           toytree_generate_next_states,
                           toytree_endgame_score_fn)
 
-def alphabeta_7_getargs() :  #TEST 38
+def alphabeta_7_getargs() :  #TEST 45
     return [NONZERO_GAME, -INF, INF,
             lambda x,y: x.children[0].score if x.children else x.score, 1, True]
 
@@ -622,9 +777,320 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
           name = 'minimax_search_alphabeta')
 
 
+# A transposition table should skip transposed positions (and their mirror
+# images) without changing the score or the best move.
+def alphabeta_8_getargs() :  #TEST 46
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    valuate = lambda board, player : len(sum(board.get_all_chains(player),[]))
+    return [GAME, -INF, INF, lambda board,maximize: [-1,1][maximize] * (valuate(board,True) - valuate(board, False)), 4, True,
+            TranspositionTable()]
+
+def alphabeta_8_testanswer(val, original_val = None) :
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return (is_dfs_return_type(val) and move_sequence(GAME, [4]) == val[0][:2]
+            and (val[1],val[2]) == (-5,592))
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = alphabeta_8_getargs,
+          testanswer = alphabeta_8_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with leaf_score -5, as without a transposition table, "
+                          +"but only 592 evaluations instead of 957."),
+          name = 'minimax_search_alphabeta')
+
+
+# Toy trees have no position keys, so a transposition table should be left
+# out of the search rather than break it.
+def alphabeta_8b_getargs() :  #TEST 47
+    return [PRUNING_GAME, -INF, INF, toytree_heuristic_fn, INF, True,
+            TranspositionTable()]
+
+def alphabeta_8b_testanswer(val, original_val = None) :
+    return (is_dfs_return_type(val)
+            and move_sequence(PRUNING_GAME, [0]) == val[0]
+            and (val[1],val[2]) == (10,4))
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = alphabeta_8b_getargs,
+          testanswer = alphabeta_8b_testanswer,
+          expected_val = ("((list of two AbstractGameState instances), 10, 4), "
+                          +"as without a transposition table"),
+          name = 'minimax_search_alphabeta')
+
+
+# Center-first, killer and history move ordering should find the same score
+# with far fewer evaluations.
+def alphabeta_9_getargs() :  #TEST 48
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    valuate = lambda board, player : len(sum(board.get_all_chains(player),[]))
+    return [GAME, -INF, INF, lambda board,maximize: [-1,1][maximize] * (valuate(board,True) - valuate(board, False)), 4, True,
+            None, MoveOrdering()]
+
+def alphabeta_9_testanswer(val, original_val = None) :
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return (is_dfs_return_type(val) and move_sequence(GAME, [4]) == val[0][:2]
+            and (val[1],val[2]) == (-5,150))
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = alphabeta_9_getargs,
+          testanswer = alphabeta_9_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with leaf_score -5, as without move ordering, "
+                          +"but only 150 evaluations instead of 957."),
+          name = 'minimax_search_alphabeta')
+
+
+# On a symmetric board, searching only one of each pair of mirror image root
+# moves should find the same score and move with fewer evaluations.
+def alphabeta_10_getargs() :  #TEST 49
+    GAME = AbstractGameState(ConnectFourBoard(), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    valuate = lambda board, player : len(sum(board.get_all_chains(player),[]))
+    return [GAME, -INF, INF, lambda board,maximize: [-1,1][maximize] * (valuate(board,True) - valuate(board, False)), 3, True,
+            None, None, None, None, None, 64, True]
+
+def alphabeta_10_testanswer(val, original_val = None) :
+    GAME = AbstractGameState(ConnectFourBoard(), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return (is_dfs_return_type(val) and move_sequence(GAME, [0]) == val[0][:2]
+            and (val[1],val[2]) == (1,34))
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = alphabeta_10_getargs,
+          testanswer = alphabeta_10_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with leaf_score 1, as without symmetric_root, "
+                          +"but only 34 evaluations instead of 55."),
+          name = 'minimax_search_alphabeta')
+
+
+# A state made from just the three Connect Four functions should get the
+# shortcuts declared on next_boards_connectfour, so that it is searched
+# without making every next board.
+def alphabeta_10b_getargs() :  #TEST 50
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return [GAME, -INF, INF, heuristic_connectfour, 5, True]
+
+def alphabeta_10b_testanswer(val, original_val = None) :
+    from lab2 import has_next_boards_connectfour, next_moves_connectfour, apply_move_connectfour
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return (GAME.rules.has_next_states_fn is has_next_boards_connectfour
+            and GAME.rules.next_moves_fn is next_moves_connectfour
+            and GAME.rules.apply_move_fn is apply_move_connectfour
+            and is_dfs_return_type(val) and (val[1],val[2]) == (25,1316))
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = alphabeta_10b_getargs,
+          testanswer = alphabeta_10b_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with leaf_score 25 and 1316 evaluations, for a state "
+                          +"whose rules have the Connect Four shortcuts."),
+          name = 'minimax_search_alphabeta')
+
+
+# An opening book (opening_book.py) of the first 2 moves, searched to depth
+# 3, should give a position and its mirror image mirrored moves and the same
+# value, the value a search of the position to depth 3 finds. The position
+# is not its own mirror image (which could store either of a pair of moves),
+# and its best move is not in the center column, which is its own mirror.
+BOOK_BOARD = ConnectFourBoard().add_piece(1).add_piece(1)
+BOOK_MIRROR_BOARD = ConnectFourBoard().add_piece(5).add_piece(5)
+
+def alphabeta_11_getargs() :  #TEST 51
+    GAME = AbstractGameState(BOOK_BOARD, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return [GAME, -INF, INF, heuristic_connectfour, 3, True]
+
+def alphabeta_11_testanswer(val, original_val = None) :
+    import os
+    from tempfile import TemporaryDirectory
+    from opening_book import OpeningBook, build_book, search_evaluator
+    with TemporaryDirectory() as book_dir :
+        path = os.path.join(book_dir, 'book.bin')
+        build_book(path, 2, search_evaluator(3))
+        with OpeningBook(path) as book :
+            entry = book.lookup(BOOK_BOARD)
+            mirror_entry = book.lookup(BOOK_MIRROR_BOARD)
+            too_late = book.lookup(BOOK_BOARD.add_piece(3))
+    return (is_dfs_return_type(val) and None not in (entry, mirror_entry)
+            and mirror_entry.move == BOOK_BOARD.mirror_move(entry.move) != entry.move
+            and entry.value == mirror_entry.value == round(val[1])
+            and too_late is None)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = alphabeta_11_getargs,
+          testanswer = alphabeta_11_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"whose leaf_score, rounded, is the value the opening "
+                          +"book holds for the position and for its mirror image."),
+          name = 'minimax_search_alphabeta')
+
+
+# The parallel search (parallel_search.py) should find the same score and
+# first move as the search one move after another, whichever player moves.
+# Everything it sends to its workers is pickled, so the heuristic is a
+# module-level function rather than a lambda.
+def alphabeta_12_getargs() :  #TEST 52
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return [[GAME, -INF, INF, lambda_minus_heur, 4, True],
+            [GAME, -INF, INF, lambda_minus_heur, 4, False]]
+
+def alphabeta_12_testanswer(val, original_val = None) :
+    from parallel_search import parallel_search_alphabeta
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    if not all(map(is_dfs_return_type, val)) :
+        return False
+    for serial, maximize in zip(val, [True, False]) :
+        parallel = parallel_search_alphabeta(GAME, -INF, INF, lambda_minus_heur, 4, maximize,
+                                             max_workers=2)
+        if (not is_dfs_return_type(parallel) or parallel[1] != serial[1]
+            or parallel[0][:2] != serial[0][:2]) :
+            return False
+    return [x[1] for x in val] == [-5, 5]
+
+make_test(type = 'MULTIFUNCTION',
+          getargs = alphabeta_12_getargs,
+          testanswer = alphabeta_12_testanswer,
+          expected_val = ("Two (best_path, leaf_score, evaluation_count) tuples, "
+                          +"with leaf_scores -5 and 5 for the maximizer and the "
+                          +"minimizer, which parallel_search_alphabeta with 2 "
+                          +"workers should match, along with the first move."),
+          name = 'minimax_search_alphabeta')
+
+
+# A SharedBound keeps the best score at a node in shared memory: improve()
+# only makes it better for the player at the node, and narrow() pulls that
+# player's side of a window to just short of it. Given to the search as
+# root_window, a bound equal to the score it finds should not change the
+# score or the move, since a tie still gets its exact score.
+def alphabeta_13_getargs() :  #TEST 53
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return [[GAME, -INF, INF, lambda_minus_heur, 4, True],
+            [GAME, -INF, INF, lambda_minus_heur, 4, False]]
+
+def alphabeta_13_testanswer(val, original_val = None) :
+    import pickle
+    from lab2 import minimax_search_alphabeta
+    from parallel_search import SharedBound, score_toward
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    if not all(map(is_dfs_return_type, val)) :
+        return False
+    for maximize, worse, better, outside in [(True, 1, 3, (5, INF)), (False, 0, -2, (-INF, -5))] :
+        bound = SharedBound(maximize, INF * (-1 if maximize else 1))
+        try :
+            bound.improve(better)
+            bound.improve(worse)
+            copy = pickle.loads(pickle.dumps(bound))
+            shared = copy.get()
+            copy.close()
+            narrowed = (score_toward(better, -INF), INF) if maximize else (-INF, score_toward(better, INF))
+            if (bound.get() != better or shared != better
+                or bound.narrow(-INF, INF) != narrowed or bound.narrow(*outside) != outside) :
+                return False
+        finally :
+            bound.close()
+    for serial, maximize in zip(val, [True, False]) :
+        bound = SharedBound(maximize, serial[1])
+        try :
+            result = minimax_search_alphabeta(GAME, -INF, INF, lambda_minus_heur, 4, maximize,
+                                              root_window=bound)
+        finally :
+            bound.close()
+        if result[1] != serial[1] or result[0][:2] != serial[0][:2] or result[2] > serial[2] :
+            return False
+    return True
+
+make_test(type = 'MULTIFUNCTION',
+          getargs = alphabeta_13_getargs,
+          testanswer = alphabeta_13_testanswer,
+          expected_val = ("Two (best_path, leaf_score, evaluation_count) tuples, "
+                          +"for the maximizer and the minimizer. With a SharedBound "
+                          +"at the same score as root_window, the search should "
+                          +"find the same score and first move."),
+          name = 'minimax_search_alphabeta')
+
+
+# A SharedTranspositionTable packs its entries into shared memory, and should
+# give back what was stored: an infinite depth, no best move, a score that is
+# not a whole number, and the player. A deeper entry of the same search keeps
+# its slot from another position, but not once a new search has started.
+# Searching with one should find the same score and first move as with a
+# TranspositionTable.
+def alphabeta_14_getargs() :  #TEST 54
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return [GAME, -INF, INF, lambda_minus_heur, 4, True, TranspositionTable()]
+
+def alphabeta_14_testanswer(val, original_val = None) :
+    from lab2 import minimax_search_alphabeta
+    from parallel_search import SharedTranspositionTable
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    table = SharedTranspositionTable(1)
+    try :
+        key = 12345
+        other_key = key + table.capacity
+        table.store(key, INF, -2.5, LOWER_BOUND, None, True)
+        entry = table.probe(key)
+        stored = (entry is not None and entry.key == key and entry.depth == INF
+                  and entry.score == -2.5 and entry.bound == LOWER_BOUND
+                  and entry.best_move is None and entry.maximize is True
+                  and table.probe(key, maximize=False) is None)
+        table.store(other_key, 3, 7, EXACT, 4, True)
+        kept = table.probe(other_key) is None and table.probe(key) == entry
+        table.new_search()
+        table.store(other_key, 3, 7, EXACT, 4, True)
+        entry = table.probe(other_key)
+        replaced = (entry is not None and (entry.depth, entry.score, entry.bound, entry.best_move)
+                    == (3, 7, EXACT, 4) and table.probe(key) is None and len(table) == 1)
+        table.new_search()
+        result = minimax_search_alphabeta(GAME, -INF, INF, lambda_minus_heur, 4, True, table)
+    finally :
+        table.close()
+    return (is_dfs_return_type(val) and (val[1],val[2]) == (-5,592)
+            and stored and kept and replaced
+            and result[1] == val[1] and result[0][:2] == val[0][:2])
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = alphabeta_14_getargs,
+          testanswer = alphabeta_14_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with leaf_score -5 and 592 evaluations, whose score "
+                          +"and first move a search with a SharedTranspositionTable "
+                          +"should match."),
+          name = 'minimax_search_alphabeta')
+
+
+# Young Brothers Wait (parallel_search.ybwc_search_alphabeta) should find the
+# same score and first move as the search one move after another. On the
+# empty board at depth 5 with 3 workers, it splits the tree and hands out
+# brothers that are still running when another causes a cutoff, so it makes
+# at least as many evaluations.
+def alphabeta_15_getargs() :  #TEST 55
+    GAME = AbstractGameState(ConnectFourBoard(), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return [GAME, -INF, INF, lambda_minus_heur, 5, True]
+
+def alphabeta_15_testanswer(val, original_val = None) :
+    from parallel_search import ybwc_search_alphabeta
+    GAME = AbstractGameState(ConnectFourBoard(), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    stats = {}
+    result = ybwc_search_alphabeta(GAME, -INF, INF, lambda_minus_heur, 5, True,
+                                   max_workers=3, stats=stats)
+    return (is_dfs_return_type(val) and is_dfs_return_type(result)
+            and (val[1],val[2]) == (1,2279)
+            and result[1] == val[1] and result[0][:2] == val[0][:2]
+            and result[2] >= val[2]
+            and stats['split_points'] > 0 and stats['aborted_evals'] > 0)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = alphabeta_15_getargs,
+          testanswer = alphabeta_15_testanswer,
+          expected_val = ("List of (best_path, leaf_score, evaluation_count) "
+                          +"with leaf_score 1 and 2279 evaluations. "
+                          +"ybwc_search_alphabeta with 3 workers should find the "
+                          +"same score and first move, with split points and at "
+                          +"least as many evaluations."),
+          name = 'minimax_search_alphabeta')
+
+
 ## progressive_deepening
 
-def progressive_0_getargs() :  #TEST 39
+def progressive_0_getargs() :  #TEST 56
     return [GAME_STATIC_ALL_LEVELS, toytree_heuristic_fn, 3, True]
 
 def progressive_0_testanswer(val, original_val = None) :
@@ -644,7 +1110,7 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
 
 
 
-def progressive_1_getargs() :  #TEST 40
+def progressive_1_getargs() :  #TEST 57
 
     GAME = AbstractGameState(BOARD_EMPTY.add_piece(3).add_piece(3), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
     valuate = lambda board, player : len(sum(board.get_all_chains(player),[]))
@@ -672,3 +1138,131 @@ make_test(type = 'FUNCTION_ENCODED_ARGS',
                           "This is a Connect Four game, requiring methods you've written.)"),
           name = 'progressive_deepening')
 
+
+
+def progressive_2_getargs() :  #TEST 58
+
+    GAME = AbstractGameState(BOARD_EMPTY.add_piece(3).add_piece(3), is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    valuate = lambda board, player : len(sum(board.get_all_chains(player),[]))
+    density = lambda board, player : sum([abs(index-3)
+                                                 for row in board.board_array
+                                                 for (piece, index) in zip(row, list(range(board.num_cols)))
+                                                 if piece and (piece == 1) == (board.count_pieces() + player) % 2])
+
+    return [GAME, lambda board,maximize: [-1,1][maximize] * (density(board, False) - density(board, True) + 2*valuate(board,True) - 3*valuate(board, False)), 5, True,
+            INF, None, None, True]
+
+def progressive_2_testanswer(val, original_val = None) :
+    if not is_class_instance(val, 'AnytimeValue'):
+        return False
+    h = val.history
+    return (all(map(is_dfs_return_type, h))
+            and [4, -2, 5, -3, 20] == [x[1] for x in h] and [7, 19, 117, 360, 2394] == [x[2] for x in h])
+
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = progressive_2_getargs,
+          testanswer = progressive_2_testanswer,
+          expected_val = ("An AnytimeValue object with the same scores as " +
+                          "progressive deepening without reuse_principal_variation, " +
+                          "but fewer total evaluations (2897 instead of 3141)."),
+          name = 'progressive_deepening')
+
+
+# A level that runs out of time should stop part way through, rather than
+# running on to the end of the level. Only the levels completed are kept in
+# the history, the same as those of a search to a fixed depth, and the
+# interrupted level only counts when the root moves were ordered by the level
+# before. Its evaluations count towards the total all the same.
+PROGRESSIVE_TIME_LIMIT = 0.5
+
+def progressive_timeout_answer(val, args, ordered) :
+    from lab2 import progressive_deepening
+    if not is_class_instance(val, 'AnytimeValue'):
+        return False
+    start_time = time()
+    timed = progressive_deepening(*args)
+    elapsed = time() - start_time
+    h = timed.history
+    partial = timed.partial_value
+    completed_evals = sum(x[2] for x in h)
+    return (elapsed < PROGRESSIVE_TIME_LIMIT + 0.25
+            and len(h) > len(val.history) and all(map(is_dfs_return_type, h))
+            and [len(x[0]) - 1 for x in h] == list(range(1, len(h) + 1))
+            and [x[1:] for x in h[:len(val.history)]] == [x[1:] for x in val.history]
+            and timed.total_evaluations > completed_evals
+            and (partial is None or (ordered and timed.get_value() is partial
+                                     and all(partial is not x for x in h)
+                                     and timed.total_evaluations >= completed_evals + partial[2])))
+
+def progressive_3_getargs() :  #TEST 59
+    return [state_starting_connectfour, heuristic_connectfour, 4, True]
+
+def progressive_3_testanswer(val, original_val = None) :
+    args = [state_starting_connectfour, heuristic_connectfour, INF, True,
+            PROGRESSIVE_TIME_LIMIT]
+    return progressive_timeout_answer(val, args, False)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = progressive_3_getargs,
+          testanswer = progressive_3_testanswer,
+          expected_val = ("An AnytimeValue object of a search to depth 4. With " +
+                          "a time limit instead, the search should return within " +
+                          "a moment of it, with the same first 4 levels and more, " +
+                          "only completed levels in the history, no partial value " +
+                          "(the root moves were not ordered), and the evaluations " +
+                          "of the interrupted level in the total."),
+          name = 'progressive_deepening')
+
+
+def progressive_4_getargs() :  #TEST 60
+    return [state_starting_connectfour, heuristic_connectfour, 4, True,
+            INF, TranspositionTable(), None, True]
+
+def progressive_4_testanswer(val, original_val = None) :
+    args = [state_starting_connectfour, heuristic_connectfour, INF, True,
+            PROGRESSIVE_TIME_LIMIT, TranspositionTable(), None, True]
+    return progressive_timeout_answer(val, args, True)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = progressive_4_getargs,
+          testanswer = progressive_4_testanswer,
+          expected_val = ("An AnytimeValue object of a search to depth 4. With " +
+                          "a time limit instead, the search should return within " +
+                          "a moment of it, with the same first 4 levels and more, " +
+                          "only completed levels in the history, and the evaluations " +
+                          "of the interrupted level in the total. The interrupted " +
+                          "level may set the value, but not the history."),
+          name = 'progressive_deepening')
+
+
+# Lazy SMP (parallel_search.lazy_smp_search) runs progressive deepening in 2
+# processes sharing one SharedTranspositionTable, and should end with the
+# score of progressive deepening in one process, after as many levels. The
+# shared memory it uses should be gone once it returns.
+def progressive_5_getargs() :  #TEST 61
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    return [GAME, lambda_minus_heur, 4, True]
+
+def progressive_5_testanswer(val, original_val = None) :
+    import os
+    from parallel_search import lazy_smp_search
+    GAME = AbstractGameState(BOARD_UHOH, is_game_over_connectfour, next_boards_connectfour, endgame_score_connectfour)
+    if not is_class_instance(val, 'AnytimeValue'):
+        return False
+    has_shm = os.path.isdir('/dev/shm')
+    shm_before = set(os.listdir('/dev/shm')) if has_shm else set()
+    lazy = lazy_smp_search(GAME, lambda_minus_heur, 4, True, num_workers=2)
+    shm_after = set(os.listdir('/dev/shm')) if has_shm else set()
+    return (is_class_instance(lazy, 'AnytimeValue') and val.get_value()[1] == -5
+            and lazy.get_value()[1] == val.get_value()[1]
+            and len(lazy.history) == len(val.history) == 4
+            and shm_after <= shm_before)
+
+make_test(type = 'FUNCTION_ENCODED_ARGS',
+          getargs = progressive_5_getargs,
+          testanswer = progressive_5_testanswer,
+          expected_val = ("An AnytimeValue object ending with score -5 at depth " +
+                          "4, which lazy_smp_search with 2 workers should match, " +
+                          "leaving no shared memory behind."),
+          name = 'progressive_deepening')
@@ -30,6 +30,9 @@ class ToyTree :
     def describe_previous_move(self) :
                 return "Took branch "+str(self.sibling_index) if self.sibling_index is not None else "[none]"
 
+    def get_previous_move(self) :
+        return self.sibling_index
+
     def get_score(self) :
         return self.score
 
@@ -127,16 +130,29 @@ def toytree_is_game_over(tree) :
 def toytree_generate_next_states(tree) :
     return tree.children
 
+def toytree_has_next_states(tree) :
+    return len(tree.children) > 0
+
+def toytree_next_moves(tree) :
+    return range(len(tree.children))
+
+def toytree_apply_move(tree, move) :
+    return tree.children[move]
+
 def toytree_endgame_score_fn(tree, is_current_player_maximizer) :
     return tree.score
 
+toytree_generate_next_states.has_next_states_fn = toytree_has_next_states
+toytree_generate_next_states.next_moves_fn = toytree_next_moves
+toytree_generate_next_states.apply_move_fn = toytree_apply_move
 
-GAME1 = AbstractGameState(tree4,
-                          toytree_is_game_over,
-                          toytree_generate_next_states,
+TOYTREE_RULES = GameRules(toytree_is_game_over, toytree_generate_next_states,
                           toytree_endgame_score_fn)
 
 
+GAME1 = AbstractGameState(tree4, rules=TOYTREE_RULES)
+
+
 
 
 def toytree_heuristic_fn(tree, is_current_player_maximizer) :
@@ -152,10 +168,7 @@ tree5.down().right().sub("H",9).sub("I",12)
 tree5.down().right().down().right().sub("M",12).sub("N",13)
 tree5.down().right().right().right().sub("J",7).down().sub("O",8)
 
-GAME_STATIC_ALL_LEVELS = AbstractGameState(tree5,
-                                           toytree_is_game_over,
-                                           toytree_generate_next_states,
-                                           toytree_endgame_score_fn)
+GAME_STATIC_ALL_LEVELS = AbstractGameState(tree5, rules=TOYTREE_RULES)
 
 tree6 = ToyTree("A")
 tree6.sub("B").sub("C")
@@ -174,8 +187,5 @@ tree6.down().right().down().down().right().sub("X",3)
 tree6.down().right().down().right().down().sub("Y",2).sub("Z",14)
 
 # A tree that checks exit condition of alpha = beta.
-GAME_EQUALITY_PRUNING = AbstractGameState(tree6,
-                         toytree_is_game_over,
-                         toytree_generate_next_states,
-                         toytree_endgame_score_fn)
+GAME_EQUALITY_PRUNING = AbstractGameState(tree6, rules=TOYTREE_RULES)
 